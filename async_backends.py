@@ -0,0 +1,195 @@
+"""Asyncio-native clients for the Spotify, OpenAI and Tavily calls the radio makes.
+
+These clients cover the same operations as the synchronous code in main.py:
+track search, recommendations, playlist create/add/cover upload, chat,
+speech, image and web search. They all share one httpx.AsyncClient, and a
+semaphore caps how many requests are in flight at once. Many stations'
+I/O can then run on a single event loop instead of one thread per call.
+StationEngine awaits coroutine backends; async_station.py adapts these
+clients into StationBackends for an engine on the same loop.
+"""
+import asyncio
+import base64
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from openai import AsyncOpenAI
+
+from station_engine import StationError
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+
+def retry_after_seconds(value, default=1.0):
+    """Seconds to wait from a Retry-After header, given either as delay-seconds or as an HTTP date"""
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class AsyncHTTP:
+    """Shared async HTTP client with a cap on concurrent in-flight requests"""
+
+    def __init__(self, max_concurrency=100, timeout=30.0, max_retries=3, transport=None):
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+
+    async def request(self, method, url, **kwargs):
+        """Send a request, waiting out 429 rate limits; raises httpx.HTTPStatusError on failure"""
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore:
+                response = await self.client.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            # Sleep outside the semaphore so rate-limited calls don't hold slots
+            await asyncio.sleep(retry_after_seconds(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        return response
+
+    async def get_bytes(self, url):
+        response = await self.request("GET", url)
+        return response.content
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncSpotify:
+    """Spotify Web API calls used by the radio"""
+
+    def __init__(self, http, token_provider):
+        # token_provider returns the current access token, so refreshed tokens are picked up per call
+        self.http = http
+        self.token_provider = token_provider
+
+    async def _call(self, method, path, **kwargs):
+        token = self.token_provider()
+        if not token:
+            raise StationError("Spotify authorization expired. Please reconnect.")
+        headers = kwargs.pop("headers", {})
+        headers["Authorization"] = f"Bearer {token}"
+        response = await self.http.request(method, f"{SPOTIFY_API_URL}{path}", headers=headers, **kwargs)
+        return response.json() if response.content else None
+
+    async def search_tracks(self, query, limit=20, market="PH"):
+        results = await self._call("GET", "/search", params={"q": query, "type": "track", "limit": limit, "market": market})
+        return results["tracks"]["items"]
+
+    async def recommendations(self, seed_genres, limit=20, market="PH", **targets):
+        params = {"seed_genres": ",".join(seed_genres), "limit": limit, "market": market}
+        params.update({f"target_{name}": value for name, value in targets.items()})
+        results = await self._call("GET", "/recommendations", params=params)
+        return results["tracks"]
+
+    async def current_user_id(self):
+        user = await self._call("GET", "/me")
+        return user["id"]
+
+    async def create_playlist(self, name, description="AI-generated OPM playlist from AI Tagalog Radio", public=True):
+        user_id = await self.current_user_id()
+        playlist = await self._call("POST", f"/users/{user_id}/playlists",
+                                    json={"name": name, "description": description, "public": public})
+        return playlist["id"]
+
+    async def add_tracks(self, playlist_id, track_ids):
+        # The endpoint takes at most 100 URIs per request
+        for start in range(0, len(track_ids), 100):
+            uris = [f"spotify:track:{track_id}" for track_id in track_ids[start:start + 100]]
+            await self._call("POST", f"/playlists/{playlist_id}/tracks", json={"uris": uris})
+
+    async def upload_cover(self, playlist_id, jpeg_bytes):
+        """Upload a JPEG (max 256 KB) as the playlist cover"""
+        await self._call("PUT", f"/playlists/{playlist_id}/images",
+                         content=base64.b64encode(jpeg_bytes), headers={"Content-Type": "image/jpeg"})
+
+    async def save_tracks(self, track_ids):
+        await self._call("PUT", "/me/tracks", params={"ids": ",".join(track_ids)})
+
+
+class AsyncOpenAIBackend:
+    """Chat, speech and image generation on the shared HTTP client"""
+
+    def __init__(self, http, api_key):
+        self.http = http
+        self.client = AsyncOpenAI(api_key=api_key, http_client=http.client)
+
+    async def chat(self, prompt, model="gpt-4o-mini"):
+        async with self.http.semaphore:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        return response.choices[0].message.content.strip()
+
+    async def chat_stream(self, prompt, model="gpt-4o-mini"):
+        """Yield completion text deltas as they arrive"""
+        async with self.http.semaphore:
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def speech(self, text, model="tts-1", voice="nova"):
+        async with self.http.semaphore:
+            response = await self.client.audio.speech.create(model=model, voice=voice, input=text)
+        return response.content
+
+    async def image(self, prompt, size="1024x1024"):
+        # DALL-E 3 has no sizes below 1024x1024, so smaller art comes from DALL-E 2
+        model = "dall-e-3" if size == "1024x1024" else "dall-e-2"
+        async with self.http.semaphore:
+            response = await self.client.images.generate(model=model, prompt=prompt, n=1, size=size)
+        return await self.http.get_bytes(response.data[0].url)
+
+
+class AsyncTavily:
+    """Tavily web search for artist info"""
+
+    def __init__(self, http, api_key):
+        self.http = http
+        self.api_key = api_key
+
+    async def search(self, query, search_depth="basic", max_results=3):
+        response = await self.http.request(
+            "POST", TAVILY_SEARCH_URL,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"query": query, "search_depth": search_depth, "max_results": max_results},
+        )
+        return response.json()
+
+
+class AsyncBackends:
+    """All async clients on one shared HTTP client; close it once when the event loop shuts down"""
+
+    def __init__(self, spotify_token, openai_api_key, tavily_api_key=None, max_concurrency=100, transport=None):
+        # spotify_token(user_id) returns that listener's current access token, or None if signed out
+        self.http = AsyncHTTP(max_concurrency=max_concurrency, transport=transport)
+        self.spotify_token = spotify_token
+        self.openai = AsyncOpenAIBackend(self.http, openai_api_key)
+        self.tavily = AsyncTavily(self.http, tavily_api_key) if tavily_api_key else None
+
+    def spotify(self, user_id):
+        """Spotify client acting for one listener"""
+        return AsyncSpotify(self.http, lambda: self.spotify_token(user_id))
+
+    async def aclose(self):
+        await self.http.aclose()
+
@@ -0,0 +1,249 @@
+"""StationEngine on the asyncio-native clients, usable without Streamlit.
+
+async_station_backends() adapts AsyncBackends into StationBackends that
+behave like the app's: candidate-pool track selection with the indie, label
+and regional strategies; DJ intros assembled from the phrase cache; and
+artwork served from the thumbnail cache. Workers and benchmarks call
+create_async_station_engine() on their own event loop and drive it with
+acreate_station, acurrent_segment and friends.
+"""
+import asyncio
+import os
+from contextlib import nullcontext
+
+from async_backends import AsyncBackends
+from dj_content import (AI_ALBUM_ART_PROMPT, AI_ARTWORK_CAPTION, DJ_PHRASES, DJ_SCRIPT_PROMPT, FALLBACK_DJ_SCRIPT,
+                        MARKETING_PROMPT, PLAYLIST_COVER_PROMPT, dj_intro_texts, fallback_artist_info,
+                        script_bank_marketing_script)
+from media_cache import MediaCache, album_image_url, artwork_key, artwork_thumbnail, segment_key
+from mp3_frames import concatenate_mp3_segments
+from station_engine import (Segment, StationBackends, StationEngine, aconsume_script_stream,
+                            extract_script_mood)
+from track_selection import CandidatePool, aselect_opm_tracks
+
+# Same voice and display size as the app, so both share cached phrases and thumbnails
+SEGMENT_VOICE = "tts-1/nova"
+ARTWORK_DISPLAY_SIZE = 300
+
+
+def cover_jpeg(image_bytes):
+    """Square 640px JPEG under Spotify's 256 KB cover limit, or None if it cannot be made small enough"""
+    import io
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB").resize((640, 640), Image.Resampling.LANCZOS)
+    for quality in (85, 70):
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= 256000:
+            return buffer.getvalue()
+    return None
+
+
+def untracked(station_id, kind, units=1):
+    return nullcontext()
+
+
+async def asynthesize_segment(clients, segment_cache, text, station_id=None, track_generation=untracked):
+    """TTS for one phrase, served from the segment cache when it has been spoken before"""
+    key = segment_key(SEGMENT_VOICE, text)
+    audio = await asyncio.to_thread(segment_cache.read, key)
+    if audio:
+        return audio
+    try:
+        with track_generation(station_id, "tts_char", len(text)):
+            audio = await clients.openai.speech(text)
+    except Exception:
+        return None
+    return await asyncio.to_thread(segment_cache.write, key, audio)
+
+
+async def awarm_dj_phrases(clients, segment_cache, track_generation=untracked):
+    """Synthesize any stock DJ phrase missing from the segment cache"""
+    await asyncio.gather(*(asynthesize_segment(clients, segment_cache, text, track_generation=track_generation)
+                           for text in DJ_PHRASES.values()))
+
+
+def async_station_backends(clients, pool, artwork_cache, segment_cache, track_generation=None, **overrides):
+    """StationBackends whose I/O runs on `clients` (AsyncBackends), sharing the pool and media caches.
+
+    track_generation(station_id, kind, units) is an optional context manager that records each
+    generation call for budgeting; a call that raises inside it is not billed. Any StationBackends
+    field can be overridden, e.g. choose_tier.
+    """
+    openai = clients.openai
+    tracked = track_generation or untracked
+
+    def spotify(station):
+        return clients.spotify(station.user_id)
+
+    async def create_playlist(station, name):
+        try:
+            return await spotify(station).create_playlist(name)
+        except Exception:
+            return None
+
+    async def add_tracks(station, tracks):
+        await spotify(station).add_tracks(station.playlist_id, [track['id'] for track in tracks])
+
+    async def upload_cover(station, image_bytes):
+        try:
+            jpeg = await asyncio.to_thread(cover_jpeg, image_bytes)
+            if jpeg is None:
+                return False
+            await spotify(station).upload_cover(station.playlist_id, jpeg)
+            return True
+        except Exception:
+            return False
+
+    async def select_tracks(station, mood, count):
+        return await aselect_opm_tracks(spotify(station), pool, mood, count)
+
+    async def generate_script(station):
+        try:
+            with tracked(station.station_id, "chat"):
+                return await openai.chat(DJ_SCRIPT_PROMPT)
+        except Exception:
+            return FALLBACK_DJ_SCRIPT
+
+    async def stream_script(station, on_mood):
+        # Tracking wraps the stream itself, so a failed stream raises through it and is not billed
+        async def deltas():
+            with tracked(station.station_id, "chat"):
+                async for delta in openai.chat_stream(DJ_SCRIPT_PROMPT):
+                    yield delta
+
+        return await aconsume_script_stream(deltas(), on_mood, FALLBACK_DJ_SCRIPT)
+
+    async def artist_info(station, artist_name, use_web_search):
+        if use_web_search and clients.tavily:
+            try:
+                with tracked(station.station_id, "web_search"):
+                    results = await clients.tavily.search(
+                        f"{artist_name} Filipino OPM artist biography achievements recent news")
+                info = " ".join(f"{result.get('content', '')[:200]}..." for result in results.get('results', [])[:2])
+                if info:
+                    return info
+            except Exception:
+                pass
+        return fallback_artist_info(artist_name)
+
+    async def marketing_script(station, track, tier):
+        artist_name, track_name = track['artists'][0]['name'], track['name']
+        if tier == "minimal":
+            return script_bank_marketing_script(artist_name, track_name)
+        info = await artist_info(station, artist_name, use_web_search=(tier == "full"))
+        try:
+            with tracked(station.station_id, "chat"):
+                return await openai.chat(MARKETING_PROMPT.format(artist=artist_name, track=track_name, artist_info=info))
+        except Exception:
+            return script_bank_marketing_script(artist_name, track_name)
+
+    async def synthesize_intro(station, track, marketing, is_indie):
+        # Cached phrases come straight from disk; the missing ones are synthesized concurrently
+        texts = dj_intro_texts(track['name'], track['artists'][0]['name'], marketing, is_indie)
+        segments = await asyncio.gather(*(asynthesize_segment(clients, segment_cache, text, station.station_id, tracked)
+                                          for text in texts))
+        return concatenate_mp3_segments(segments)
+
+    async def cover_art(station, tier):
+        # Skipped when the budget is exhausted
+        if tier == "minimal":
+            return None
+        size = "1024x1024" if tier == "full" else "512x512"
+        try:
+            with tracked(station.station_id, "image_1024" if tier == "full" else "image_512"):
+                return await openai.image(PLAYLIST_COVER_PROMPT.format(mood=station.mood, playlist_name=station.playlist_name),
+                                          size=size)
+        except Exception:
+            return None
+
+    async def cached_artwork(key, fetch):
+        """Thumbnail for an artwork key, fetching and shrinking the full image only on a cache miss"""
+        cache_key = artwork_key(key, ARTWORK_DISPLAY_SIZE)
+        cached = await asyncio.to_thread(artwork_cache.read, cache_key)
+        if cached or fetch is None:
+            return cached
+        try:
+            image_bytes = await fetch()
+        except Exception:
+            return None
+        if not image_bytes:
+            return None
+        try:
+            thumbnail = await asyncio.to_thread(artwork_thumbnail, image_bytes, ARTWORK_DISPLAY_SIZE)
+        except Exception:
+            return None
+        return await asyncio.to_thread(artwork_cache.write, cache_key, thumbnail)
+
+    async def album_artwork(track):
+        url = album_image_url(track, ARTWORK_DISPLAY_SIZE)
+        if not url:
+            return None
+        return await cached_artwork(f"album:{track['album']['id']}", lambda: clients.http.get_bytes(url))
+
+    async def artwork(station, track, tier):
+        # Real album art by default; AI art only when opted in and the budget allows
+        if station.options.get("ai_album_art") and tier != "minimal":
+            size = "1024x1024" if tier == "full" else "512x512"
+
+            async def generate():
+                with tracked(station.station_id, "image_1024" if tier == "full" else "image_512"):
+                    return await openai.image(AI_ALBUM_ART_PROMPT.format(mood="vibrant OPM", track_name=track['name']),
+                                              size=size)
+
+            album_art = await cached_artwork(f"ai:{track['id']}", generate)
+            if album_art:
+                return album_art, AI_ARTWORK_CAPTION
+        return await album_artwork(track), "Album Art"
+
+    async def load_segment(station, track, ref):
+        """Rebuild a saved segment from the phrase and artwork caches instead of regenerating it"""
+        intro_audio = await synthesize_intro(station, track, ref['marketing_script'], ref['is_indie'])
+        artwork_bytes, caption = None, "Album Art"
+        if ref['artwork_caption'] == AI_ARTWORK_CAPTION:
+            artwork_bytes, caption = await cached_artwork(f"ai:{track['id']}", None), AI_ARTWORK_CAPTION
+        if not artwork_bytes:
+            artwork_bytes, caption = await album_artwork(track), "Album Art"
+        return Segment(track, ref['marketing_script'], intro_audio, artwork_bytes, caption,
+                       ref['tier'], ref['is_indie'], ref['created_at'])
+
+    backends = dict(
+        create_playlist=create_playlist,
+        add_tracks=add_tracks,
+        upload_cover=upload_cover,
+        select_tracks=select_tracks,
+        generate_script=generate_script,
+        stream_script=stream_script,
+        extract_mood=extract_script_mood,
+        marketing_script=marketing_script,
+        synthesize_intro=synthesize_intro,
+        cover_art=cover_art,
+        artwork=artwork,
+        load_segment=load_segment,
+    )
+    backends.update(overrides)
+    return StationBackends(**backends)
+
+
+async def create_async_station_engine(spotify_token, openai_api_key, tavily_api_key=None, pool=None,
+                                      artwork_cache=None, segment_cache=None, track_generation=None,
+                                      choose_tier=None, max_concurrency=100, transport=None, **engine_options):
+    """Engine plus its AsyncBackends on the running event loop; close the clients with aclose() on shutdown.
+
+    spotify_token(user_id) returns a listener's current access token. Caches default to the
+    app's directories (same environment variables), so workers reuse its phrases and thumbnails.
+    The stock DJ phrases are pre-rendered before the engine is returned, so no intro waits on them.
+    """
+    clients = AsyncBackends(spotify_token, openai_api_key, tavily_api_key, max_concurrency=max_concurrency,
+                            transport=transport)
+    pool = pool or CandidatePool(ttl=int(os.getenv("CANDIDATE_POOL_TTL", 1800)))
+    artwork_cache = artwork_cache or MediaCache(os.getenv("ARTWORK_CACHE_DIR", ".cache/artwork"),
+                                                int(os.getenv("ARTWORK_CACHE_MAX_BYTES", 50 * 1024 * 1024)), "jpg")
+    segment_cache = segment_cache or MediaCache(os.getenv("SEGMENT_CACHE_DIR", ".cache/segments"),
+                                                int(os.getenv("SEGMENT_CACHE_MAX_BYTES", 100 * 1024 * 1024)), "mp3")
+    overrides = {"choose_tier": choose_tier} if choose_tier else {}
+    backends = async_station_backends(clients, pool, artwork_cache, segment_cache,
+                                      track_generation=track_generation, **overrides)
+    await awarm_dj_phrases(clients, segment_cache, track_generation or untracked)
+    return StationEngine(backends, **engine_options), clients
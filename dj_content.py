@@ -0,0 +1,95 @@
+"""Scripts, prompts and stock copy the AI DJ uses, shared by the sync app and the async engine."""
+import random
+
+DJ_SCRIPT_PROMPT = """
+    Ikaw ay isang radio DJ na masigla sa isang Tagalog radio station. 
+    
+    Gumawa ng:
+    1. Magandang DJ intro/patter sa Tagalog (2-3 sentences)
+    2. Describe kung anong mood/genre ng kanta na gusto mo i-play (e.g., "masayang pop song", "romantic ballad", "energetic dance track")
+    3. Include marketing hype about the upcoming song
+    
+    Format your response as:
+    INTRO: [your tagalog DJ intro]
+    MOOD: [mood/genre you want to play] 
+    HYPE: [marketing line about the song]
+    
+    Be engaging, fun, and authentically Filipino!
+    """
+
+FALLBACK_DJ_SCRIPT = """INTRO: Kamusta mga ka-tropa! Narito si DJ AI para sa inyong paboritong kanta!
+MOOD: masayang pop song
+HYPE: Pakinggan natin ang bagong hit na siguradong magpapasaya sa inyong araw!"""
+
+MARKETING_PROMPT = """
+    Ikaw ay isang radio DJ na nag-market ng OPM artists. 
+    
+    Artist: {artist}
+    Song: {track}
+    Artist Info: {artist_info}
+    
+    Gumawa ng 2-3 pangungusap na marketing script sa Tagalog about the artist.
+    Include interesting facts, recent achievements, or why listeners should follow them.
+    Be enthusiastic and promotional!
+    """
+
+# Pre-written marketing copy used instead of a live completion when the budget is tight
+MARKETING_SCRIPT_BANK = [
+    "Si {artist} ay isa sa mga pinakasikat na OPM artist ngayon! Suportahan natin ang kanilang kantang {track}!",
+    "Heto na ang {track} ni {artist}! I-follow niyo sila sa Spotify para hindi kayo mahuli sa mga bagong release nila!",
+    "Kung hindi mo pa kilala si {artist}, ngayon na ang tamang panahon! Pakinggan ang {track} at siguradong mapapa-repeat ka!",
+    "Proud Pinoy music tayo dito! Si {artist} ay patuloy na nagbibigay ng magagandang kanta tulad ng {track}!",
+]
+
+
+def script_bank_marketing_script(artist_name, track_name):
+    """Marketing copy from the script bank, no API call"""
+    return random.choice(MARKETING_SCRIPT_BANK).format(artist=artist_name, track=track_name)
+
+
+# Artist blurbs used when web search is off or fails
+ARTIST_INFO = {
+    "Ben&Ben": "Ben&Ben ay isa sa mga pinakasikat na indie folk band sa Pilipinas na kilala sa kanilang emosyonal na mga kanta at magagandang lyrics.",
+    "Moira Dela Torre": "Si Moira Dela Torre ay isang award-winning Filipino singer-songwriter na kilala sa kanyang mataas na boses at heartfelt na mga ballade.",
+    "December Avenue": "December Avenue ay isang Filipino rock band na naging viral sa social media dahil sa kanilang mga romantic at relatable na mga kanta.",
+    "IV of Spades": "IV of Spades ay isang Filipino rock band na naging kilala sa kanilang retro-funk sound at catchy na mga hit songs.",
+    "SB19": "SB19 ay ang unang Filipino boy group na naging international sensation at naging pride ng Pilipinas sa K-pop industry.",
+    "BINI": "BINI ay isang rising Filipino girl group na naging viral sa TikTok at kilala sa kanilang energetic performances.",
+    "Eraserheads": "Eraserheads ay ang 'Beatles ng Pilipinas' at isa sa mga pinakaimpluwensyal na banda sa OPM history.",
+    "Rivermaya": "Rivermaya ay isa sa mga pioneering rock bands sa Pilipinas na may malaking contribution sa 90s OPM scene."
+}
+
+
+def fallback_artist_info(artist_name):
+    return ARTIST_INFO.get(artist_name, f"Si {artist_name} ay isa sa mga talented na OPM artist na patuloy na nagbibigay ng magagandang kanta para sa mga Filipino music lovers!")
+
+
+PLAYLIST_COVER_PROMPT = """
+    Create a vibrant playlist cover for "{playlist_name}". 
+    Style: {mood}, Filipino-inspired, modern design, music themed.
+    Include musical elements like notes, instruments, or sound waves.
+    Colors: Bright and appealing, suitable for a music playlist cover.
+    Format: Square album cover style, professional quality.
+    """
+
+AI_ALBUM_ART_PROMPT = "{mood} abstract album art for {track_name}, vibrant Filipino-inspired colors, modern design"
+AI_ARTWORK_CAPTION = "AI Generated Album Art"
+
+
+# Stock DJ phrases, synthesized once and served from the segment cache
+DJ_PHRASES = {
+    "greeting": "Kamusta mga ka-tropa! Narito ang susunod nating kanta.",
+    "indie_promo": "Ito ay isang hidden gem mula sa isang talented indie artist na deserve ng mas maraming suporta!",
+    "station_id": "Dito lang sa AI Tagalog Radio!",
+}
+
+
+def dj_intro_texts(track_name, artist_name, marketing_script, is_indie_artist=False):
+    """Phrases of one DJ intro, in order: stock greeting and promo, track-specific lines, station ID"""
+    texts = [DJ_PHRASES["greeting"]]
+    if is_indie_artist:
+        texts.append(DJ_PHRASES["indie_promo"])
+    texts.append(marketing_script)
+    texts.append(f"Pakinggan natin ang {track_name} ni {artist_name}!")
+    texts.append(DJ_PHRASES["station_id"])
+    return texts
@@ -1,6 +1,7 @@
 import streamlit as st
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.cache_handler import MemoryCacheHandler
 import openai
 import requests
 import io
@@ -8,6 +9,24 @@ import os
 from concurrent.futures import ThreadPoolExecutor
 import json
 import time
+import random
+import threading
+import uuid
+import secrets
+from collections import deque
+from contextlib import contextmanager
+from station_engine import (DEFAULT_MOOD, Segment, StationBackends, StationEngine, StationError, consume_script_stream,
+                            extract_script_mood)
+from station_store import StationStore
+from mp3_frames import concatenate_mp3_segments
+from media_cache import MediaCache, album_image_url, artwork_key, artwork_thumbnail, segment_key
+from track_selection import (EMERGING_MAX_POPULARITY, GENERIC_OPM_QUERY, GENRE_QUERIES, INDIE_LABELS,
+                             INDIE_MAX_POPULARITY, INDIE_SEARCH_TERMS, MOOD_FALLBACK_ARTISTS, OPM_ARTISTS,
+                             REGIONAL_MAX_POPULARITY, REGIONAL_TERMS, VARIETY_MOODS, CandidatePool,
+                             emerging_search_terms, lowest_popularity, mood_search_plan, newest_lowest_popularity)
+from dj_content import (AI_ALBUM_ART_PROMPT, AI_ARTWORK_CAPTION, DJ_PHRASES, DJ_SCRIPT_PROMPT, FALLBACK_DJ_SCRIPT,
+                        MARKETING_PROMPT, PLAYLIST_COVER_PROMPT, dj_intro_texts, fallback_artist_info,
+                        script_bank_marketing_script)
 
 # Try to import Tavily, fallback if not available
 try:
@@ -39,75 +58,188 @@ if TAVILY_AVAILABLE:
     except:
         TAVILY_AVAILABLE = False
 
-def generate_dj_script():
-    """Generate a DJ script that includes mood, genre, and song selection criteria"""
-    prompt = """
-    Ikaw ay isang radio DJ na masigla sa isang Tagalog radio station. 
-    
-    Gumawa ng:
-    1. Magandang DJ intro/patter sa Tagalog (2-3 sentences)
-    2. Describe kung anong mood/genre ng kanta na gusto mo i-play (e.g., "masayang pop song", "romantic ballad", "energetic dance track")
-    3. Include marketing hype about the upcoming song
-    
-    Format your response as:
-    INTRO: [your tagalog DJ intro]
-    MOOD: [mood/genre you want to play] 
-    HYPE: [marketing line about the song]
+# How long harvested search results stay eligible for selection (seconds)
+CANDIDATE_POOL_TTL = int(os.getenv("CANDIDATE_POOL_TTL") or st.secrets.get("CANDIDATE_POOL_TTL", 1800))
+
+@st.cache_resource
+def get_candidate_pool():
+    """Shared track candidate pool, reused across stations"""
+    return CandidatePool(ttl=CANDIDATE_POOL_TTL)
+
+# Generation budget limits: estimated USD per rolling hour and concurrent calls
+GENERATION_BUDGET_GLOBAL_HOURLY = float(os.getenv("GENERATION_BUDGET_GLOBAL_HOURLY") or st.secrets.get("GENERATION_BUDGET_GLOBAL_HOURLY", 20.0))
+GENERATION_BUDGET_STATION_HOURLY = float(os.getenv("GENERATION_BUDGET_STATION_HOURLY") or st.secrets.get("GENERATION_BUDGET_STATION_HOURLY", 2.0))
+GENERATION_MAX_INFLIGHT = int(os.getenv("GENERATION_MAX_INFLIGHT") or st.secrets.get("GENERATION_MAX_INFLIGHT", 16))
+GENERATION_MAX_INFLIGHT_STATION = int(os.getenv("GENERATION_MAX_INFLIGHT_STATION") or st.secrets.get("GENERATION_MAX_INFLIGHT_STATION", 4))
+
+# Approximate list price per call (per character for TTS)
+GENERATION_COSTS = {
+    "image_1024": 0.04,
+    "image_512": 0.018,
+    "chat": 0.0005,
+    "tts_char": 0.000015,
+    "web_search": 0.008,
+}
+
+# Expected latency per call (seconds) by kind; override with a JSON object, e.g. {"chat": 3}
+GENERATION_LATENCY_TARGETS = {
+    "image_1024": 20.0,
+    "image_512": 10.0,
+    "chat": 4.0,
+    "tts_char": 4.0,
+    "web_search": 3.0,
+}
+GENERATION_LATENCY_TARGETS.update(json.loads(os.getenv("GENERATION_LATENCY_TARGETS") or st.secrets.get("GENERATION_LATENCY_TARGETS", "{}")))
+# Only calls this recent (seconds) count towards latency pressure
+GENERATION_LATENCY_WINDOW = 600
+
+# Tiers from most to least expensive:
+#   full    - DALL-E 3 1024x1024 art, live marketing script, Tavily artist search
+#   reduced - 512x512 art, live marketing script, no Tavily
+#   minimal - Spotify album image, script-bank marketing copy, no Tavily
+GENERATION_TIERS = ["full", "reduced", "minimal"]
+
+@st.cache_resource
+def get_generation_budget():
+    """Shared spend/latency ledger for all stations in this process"""
+    return {
+        "lock": threading.Lock(),
+        "spend": deque(),          # (timestamp, station_id, cost)
+        "latency": {},             # kind -> deque of (timestamp, seconds)
+        "station_latency": {},     # station_id -> kind -> deque of (timestamp, seconds)
+        "inflight": {},            # station_id -> calls in flight
+        "tier_counts": {tier: 0 for tier in GENERATION_TIERS},
+        "station_tiers": {},       # station_id -> (tier, timestamp)
+    }
+
+def latency_pressure(samples_by_kind, cutoff):
+    """Worst ratio of recent average latency to that kind's target"""
+    pressure = 0.0
+    for kind, samples in samples_by_kind.items():
+        recent = [seconds for timestamp, seconds in samples if timestamp >= cutoff]
+        if recent:
+            pressure = max(pressure, (sum(recent) / len(recent)) / GENERATION_LATENCY_TARGETS[kind])
+    return pressure
+
+@contextmanager
+def track_generation(station_id, kind, units=1):
+    """Count a generation call as in flight, then record its latency and estimated cost"""
+    budget = get_generation_budget()
+    with budget["lock"]:
+        budget["inflight"][station_id] = budget["inflight"].get(station_id, 0) + 1
+    start = time.time()
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        with budget["lock"]:
+            budget["inflight"][station_id] -= 1
+            if not budget["inflight"][station_id]:
+                del budget["inflight"][station_id]
+            sample = (time.time(), time.time() - start)
+            budget["latency"].setdefault(kind, deque(maxlen=50)).append(sample)
+            budget["station_latency"].setdefault(station_id, {}).setdefault(kind, deque(maxlen=20)).append(sample)
+            if succeeded:
+                budget["spend"].append((time.time(), station_id, GENERATION_COSTS[kind] * units))
+
+def get_generation_usage(station_id=None):
+    """Spend over the last hour, calls in flight and latency pressure, globally and for one station"""
+    budget = get_generation_budget()
+    now = time.time()
+    cutoff = now - 3600
+    latency_cutoff = now - GENERATION_LATENCY_WINDOW
+    with budget["lock"]:
+        while budget["spend"] and budget["spend"][0][0] < cutoff:
+            budget["spend"].popleft()
+        # Forget per-station latency and tiers once a station has gone quiet
+        for sid in [sid for sid, kinds in budget["station_latency"].items()
+                    if all(samples[-1][0] < latency_cutoff for samples in kinds.values())]:
+            del budget["station_latency"][sid]
+        for sid in [sid for sid, (_, timestamp) in budget["station_tiers"].items() if timestamp < cutoff]:
+            del budget["station_tiers"][sid]
+        station_tier = budget["station_tiers"].get(station_id)
+        return {
+            "global_spend": sum(cost for _, _, cost in budget["spend"]),
+            "station_spend": sum(cost for _, sid, cost in budget["spend"] if sid == station_id),
+            "global_inflight": sum(budget["inflight"].values()),
+            "station_inflight": budget["inflight"].get(station_id, 0),
+            "global_latency_pressure": latency_pressure(budget["latency"], latency_cutoff),
+            "station_latency_pressure": latency_pressure(budget["station_latency"].get(station_id, {}), latency_cutoff),
+            "tier_counts": dict(budget["tier_counts"]),
+            "station_tier": station_tier[0] if station_tier else None,
+        }
+
+def choose_generation_tier(station_id):
+    """Pick how much to spend on the next track based on the tightest budget limit"""
+    usage = get_generation_usage(station_id)
+    pressure = max(
+        usage["global_spend"] / GENERATION_BUDGET_GLOBAL_HOURLY,
+        usage["station_spend"] / GENERATION_BUDGET_STATION_HOURLY,
+        usage["global_inflight"] / GENERATION_MAX_INFLIGHT,
+        usage["station_inflight"] / GENERATION_MAX_INFLIGHT_STATION,
+        usage["global_latency_pressure"],
+        usage["station_latency_pressure"],
+    )
     
-    Be engaging, fun, and authentically Filipino!
-    """
+    if pressure < 0.7:
+        tier = "full"
+    elif pressure < 1.0:
+        tier = "reduced"
+    else:
+        tier = "minimal"
     
+    budget = get_generation_budget()
+    with budget["lock"]:
+        budget["tier_counts"][tier] += 1
+        budget["station_tiers"][station_id] = (tier, time.time())
+    return tier
+
+def generate_dj_script(station_id=None):
+    """Generate a DJ script that includes mood, genre, and song selection criteria"""
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with track_generation(station_id, "chat"):
+            response = openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": DJ_SCRIPT_PROMPT}]
+            )
         return response.choices[0].message.content.strip()
     except Exception as e:
-        return """INTRO: Kamusta mga ka-tropa! Narito si DJ AI para sa inyong paboritong kanta!
-MOOD: masayang pop song
-HYPE: Pakinggan natin ang bagong hit na siguradong magpapasaya sa inyong araw!"""
+        return FALLBACK_DJ_SCRIPT
+
+def stream_dj_script(on_mood, station_id=None):
+    """Stream the DJ script, calling on_mood(mood) as soon as the MOOD line is complete"""
+    def deltas():
+        with track_generation(station_id, "chat"):
+            stream = openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": DJ_SCRIPT_PROMPT}],
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    
+    return consume_script_stream(deltas(), on_mood, FALLBACK_DJ_SCRIPT)
 
 def extract_mood_from_script(script):
     """Extract mood/genre from DJ script to use for Spotify search"""
     try:
-        lines = script.split('\n')
-        mood_line = [line for line in lines if line.startswith('MOOD:')]
-        if mood_line:
-            mood = mood_line[0].replace('MOOD:', '').strip()
-            return mood
-        return "happy upbeat song"
+        return extract_script_mood(script)
     except:
-        return "happy upbeat song"
+        return DEFAULT_MOOD
 
-def search_spotify_by_mood(sp, mood_description):
+def search_spotify_by_mood(sp, mood_description, exclude_ids=None):
     """Search Spotify for OPM songs based on mood description"""
     try:
-        # Map mood to search terms and audio features for OPM
-        mood_lower = mood_description.lower()
-        
-        # OPM-specific search terms based on mood
-        opm_search_terms = []
-        target_features = {}
-        
-        if any(word in mood_lower for word in ['masaya', 'happy', 'energetic']):
-            opm_search_terms = ['OPM happy', 'Filipino pop upbeat', 'Pinoy rock energetic']
-            target_features = {'valence': 0.8, 'energy': 0.7}
-        elif any(word in mood_lower for word in ['romantic', 'love', 'ballad', 'hugot']):
-            opm_search_terms = ['OPM love songs', 'Filipino ballad', 'Pinoy romantic', 'hugot songs']
-            target_features = {'valence': 0.6, 'energy': 0.4}
-        elif any(word in mood_lower for word in ['dance', 'sayaw', 'party', 'disco']):
-            opm_search_terms = ['OPM dance', 'Filipino party songs', 'Pinoy disco']
-            target_features = {'danceability': 0.8, 'energy': 0.8}
-        elif any(word in mood_lower for word in ['sad', 'malungkot', 'emo']):
-            opm_search_terms = ['OPM sad', 'Filipino emotional', 'Pinoy emo']
-            target_features = {'valence': 0.3, 'energy': 0.4}
-        elif any(word in mood_lower for word in ['rock', 'metal', 'alternative']):
-            opm_search_terms = ['OPM rock', 'Filipino rock', 'Pinoy alternative', 'Pinoy metal']
-            target_features = {'energy': 0.8, 'loudness': -5}
-        else:
-            opm_search_terms = ['OPM hits', 'Filipino pop', 'Pinoy classics']
-            target_features = {'valence': 0.6, 'energy': 0.6}
+        # Map mood to OPM search terms and audio features
+        opm_search_terms, target_features = mood_search_plan(mood_description)
+        
+        # Serve from previously harvested results before hitting Spotify again
+        bucket = f"mood:{opm_search_terms[0]}"
+        track = get_candidate_pool().draw(bucket, exclude_ids)
+        if track:
+            return track
         
         # Try recommendations with Philippines OPM genre first
         try:
@@ -118,9 +250,11 @@ def search_spotify_by_mood(sp, mood_description):
                 **{f'target_{k}': v for k, v in target_features.items()}
             )
             if recommendations['tracks']:
-                import random
-                # Return a random track from recommendations instead of always first
-                return random.choice(recommendations['tracks'][:10])
+                # Keep the whole page and return a random track instead of always first
+                get_candidate_pool().add(bucket, recommendations['tracks'], source='recommendations')
+                track = get_candidate_pool().draw(bucket, exclude_ids)
+                if track:
+                    return track
         except:
             pass
         
@@ -130,33 +264,40 @@ def search_spotify_by_mood(sp, mood_description):
                 # Search with Philippines market preference
                 results = sp.search(q=term, type='track', limit=50, market='PH')
                 if results['tracks']['items']:
-                    import random
-                    # Return random track from search results
-                    return random.choice(results['tracks']['items'][:20])
+                    # Harvest the full page, return a random track from it
+                    get_candidate_pool().add(bucket, results['tracks']['items'], source=term)
+                    track = get_candidate_pool().draw(bucket, exclude_ids)
+                    if track:
+                        return track
             except:
                 continue
         
-        # Additional OPM artist search
-        famous_opm_artists = [
-            'Ben&Ben', 'Moira Dela Torre', 'December Avenue', 'The Juans',
-            'IV of Spades', 'Unique Salonga', 'SB19', 'BINI', 'Parokya ni Edgar',
-            'Rivermaya', 'Eraserheads', 'Bamboo', 'Sponge Cola', 'Silent Sanctuary',
-            'Kamikazee', 'Callalily', 'Moonstar88', 'Itchyworms', 'Orange and Lemons'
-        ]
-        
-        for artist in famous_opm_artists[:5]:  # Try first 5 artists
+        # These results don't match the mood, so they go to artist/generic buckets, not the mood bucket
+        for artist in MOOD_FALLBACK_ARTISTS:
+            artist_bucket = f"artist:{artist}"
+            track = get_candidate_pool().draw(artist_bucket, exclude_ids)
+            if track:
+                return track
             try:
                 results = sp.search(q=f'artist:{artist}', type='track', limit=20, market='PH')
                 if results['tracks']['items']:
-                    return results['tracks']['items'][0]
+                    get_candidate_pool().add(artist_bucket, results['tracks']['items'], source=f'artist:{artist}')
+                    track = get_candidate_pool().draw(artist_bucket, exclude_ids)
+                    if track:
+                        return track
             except:
                 continue
         
         # Final fallback - general OPM search
+        generic_bucket = f"genre:{GENERIC_OPM_QUERY}"
+        track = get_candidate_pool().draw(generic_bucket, exclude_ids)
+        if track:
+            return track
         try:
-            results = sp.search(q='OPM Filipino music', type='track', limit=20, market='PH')
+            results = sp.search(q=GENERIC_OPM_QUERY, type='track', limit=20, market='PH')
             if results['tracks']['items']:
-                return results['tracks']['items'][0]
+                get_candidate_pool().add(generic_bucket, results['tracks']['items'], source=GENERIC_OPM_QUERY)
+                return get_candidate_pool().draw(generic_bucket, exclude_ids)
         except:
             pass
             
@@ -166,27 +307,66 @@ def search_spotify_by_mood(sp, mood_description):
         st.error(f"Spotify search error: {e}")
         return None
 
-def generate_tts(text):
+def generate_tts(text, station_id=None):
     try:
-        response = openai.audio.speech.create(
-            model="tts-1",
-            voice="nova",
-            input=text
-        )
+        with track_generation(station_id, "tts_char", units=len(text)):
+            response = openai.audio.speech.create(
+                model="tts-1",
+                voice="nova",
+                input=text
+            )
         return response.content
     except Exception as e:
         st.error(f"TTS Error: {e}")
         return None
 
-def generate_album_art(mood, track_name):
-    prompt = f"{mood} abstract album art for {track_name}, vibrant Filipino-inspired colors, modern design"
+# Pre-synthesized DJ audio: fixed phrases and stingers are cached, only track-specific parts hit TTS
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR") or st.secrets.get("SEGMENT_CACHE_DIR", ".cache/segments")
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES") or st.secrets.get("SEGMENT_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+SEGMENT_VOICE = "tts-1/nova"
+
+@st.cache_resource
+def get_segment_cache():
+    return MediaCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, "mp3")
+
+def synthesize_segment(text, station_id=None):
+    """TTS for one phrase, served from the segment cache when it has been spoken before"""
+    cache = get_segment_cache()
+    key = segment_key(SEGMENT_VOICE, text)
+    audio = cache.read(key)
+    if audio:
+        return audio
+    
+    audio = generate_tts(text, station_id=station_id)
+    if not audio:
+        return None
+    return cache.write(key, audio)
+
+def warm_dj_phrases():
+    """Synthesize any stock DJ phrase missing from the segment cache"""
+    for text in DJ_PHRASES.values():
+        synthesize_segment(text)
+
+def assemble_dj_intro(track_name, artist_name, marketing_script, is_indie_artist=False, station_id=None):
+    """DJ intro audio built from cached stock phrases plus freshly synthesized track-specific lines"""
+    texts = dj_intro_texts(track_name, artist_name, marketing_script, is_indie_artist)
+    # Cached phrases return immediately; the missing ones are synthesized in parallel
+    with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+        segments = list(executor.map(lambda text: synthesize_segment(text, station_id=station_id), texts))
+    return concatenate_mp3_segments(segments)
+
+def generate_album_art(mood, track_name, size="1024x1024", station_id=None):
+    prompt = AI_ALBUM_ART_PROMPT.format(mood=mood, track_name=track_name)
     try:
-        response = openai.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            n=1,
-            size="1024x1024"
-        )
+        # DALL-E 3 has no sizes below 1024x1024, so smaller art comes from DALL-E 2
+        model = "dall-e-3" if size == "1024x1024" else "dall-e-2"
+        with track_generation(station_id, "image_1024" if size == "1024x1024" else "image_512"):
+            response = openai.images.generate(
+                model=model,
+                prompt=prompt,
+                n=1,
+                size=size
+            )
         img_url = response.data[0].url
         img_response = requests.get(img_url)
         return img_response.content
@@ -194,16 +374,65 @@ def generate_album_art(mood, track_name):
         st.error(f"Image generation error: {e}")
         return None
 
-def search_artist_info(artist_name):
+# Local thumbnail cache for album and AI artwork
+ARTWORK_CACHE_DIR = os.getenv("ARTWORK_CACHE_DIR") or st.secrets.get("ARTWORK_CACHE_DIR", ".cache/artwork")
+ARTWORK_CACHE_MAX_BYTES = int(os.getenv("ARTWORK_CACHE_MAX_BYTES") or st.secrets.get("ARTWORK_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+ARTWORK_DISPLAY_SIZE = 300
+
+@st.cache_resource
+def get_artwork_cache():
+    return MediaCache(ARTWORK_CACHE_DIR, ARTWORK_CACHE_MAX_BYTES, "jpg")
+
+def read_cached_artwork(key, size=ARTWORK_DISPLAY_SIZE):
+    """Return cached thumbnail bytes, marking the file as recently used"""
+    return get_artwork_cache().read(artwork_key(key, size))
+
+def write_cached_artwork(key, image_bytes, size=ARTWORK_DISPLAY_SIZE):
+    """Shrink an image to display size, store it in the cache and return the thumbnail bytes"""
+    return get_artwork_cache().write(artwork_key(key, size), artwork_thumbnail(image_bytes, size))
+
+def get_track_artwork(track, size=ARTWORK_DISPLAY_SIZE):
+    """Spotify album image for a track, served from the local thumbnail cache"""
+    try:
+        key = f"album:{track['album']['id']}"
+        cached = read_cached_artwork(key, size)
+        if cached:
+            return cached
+        
+        url = album_image_url(track, size)
+        if not url:
+            return None
+        
+        img_response = requests.get(url, timeout=10)
+        img_response.raise_for_status()
+        return write_cached_artwork(key, img_response.content, size)
+    except Exception as e:
+        st.error(f"Album artwork error: {e}")
+        return None
+
+def get_ai_artwork(track, image_size="1024x1024", station_id=None, size=ARTWORK_DISPLAY_SIZE):
+    """AI-generated art for a track; only used when the listener opts in"""
+    key = f"ai:{track['id']}"
+    cached = read_cached_artwork(key, size)
+    if cached:
+        return cached
+    
+    album_art = generate_album_art("vibrant OPM", track['name'], size=image_size, station_id=station_id)
+    if not album_art:
+        return None
+    return write_cached_artwork(key, album_art, size)
+
+def search_artist_info(artist_name, use_web_search=True, station_id=None):
     """Search for artist information and marketing content"""
-    if TAVILY_AVAILABLE and tavily_client:
+    if use_web_search and TAVILY_AVAILABLE and tavily_client:
         try:
             query = f"{artist_name} Filipino OPM artist biography achievements recent news"
-            search_results = tavily_client.search(
-                query=query,
-                search_depth="basic",
-                max_results=3
-            )
+            with track_generation(station_id, "web_search"):
+                search_results = tavily_client.search(
+                    query=query,
+                    search_depth="basic",
+                    max_results=3
+                )
             
             # Combine search results into marketing content
             marketing_info = ""
@@ -215,39 +444,18 @@ def search_artist_info(artist_name):
         except Exception as e:
             pass
     
-    # Fallback artist info database for popular OPM artists
-    artist_info_db = {
-        "Ben&Ben": "Ben&Ben ay isa sa mga pinakasikat na indie folk band sa Pilipinas na kilala sa kanilang emosyonal na mga kanta at magagandang lyrics.",
-        "Moira Dela Torre": "Si Moira Dela Torre ay isang award-winning Filipino singer-songwriter na kilala sa kanyang mataas na boses at heartfelt na mga ballade.",
-        "December Avenue": "December Avenue ay isang Filipino rock band na naging viral sa social media dahil sa kanilang mga romantic at relatable na mga kanta.",
-        "IV of Spades": "IV of Spades ay isang Filipino rock band na naging kilala sa kanilang retro-funk sound at catchy na mga hit songs.",
-        "SB19": "SB19 ay ang unang Filipino boy group na naging international sensation at naging pride ng Pilipinas sa K-pop industry.",
-        "BINI": "BINI ay isang rising Filipino girl group na naging viral sa TikTok at kilala sa kanilang energetic performances.",
-        "Eraserheads": "Eraserheads ay ang 'Beatles ng Pilipinas' at isa sa mga pinakaimpluwensyal na banda sa OPM history.",
-        "Rivermaya": "Rivermaya ay isa sa mga pioneering rock bands sa Pilipinas na may malaking contribution sa 90s OPM scene."
-    }
-    
-    return artist_info_db.get(artist_name, f"Si {artist_name} ay isa sa mga talented na OPM artist na patuloy na nagbibigay ng magagandang kanta para sa mga Filipino music lovers!")
+    return fallback_artist_info(artist_name)
 
-def generate_artist_marketing_script(artist_name, track_name, artist_info):
+def generate_artist_marketing_script(artist_name, track_name, artist_info, station_id=None):
     """Generate marketing script about the artist using web search results"""
-    prompt = f"""
-    Ikaw ay isang radio DJ na nag-market ng OPM artists. 
-    
-    Artist: {artist_name}
-    Song: {track_name}
-    Artist Info: {artist_info}
-    
-    Gumawa ng 2-3 pangungusap na marketing script sa Tagalog about the artist.
-    Include interesting facts, recent achievements, or why listeners should follow them.
-    Be enthusiastic and promotional!
-    """
+    prompt = MARKETING_PROMPT.format(artist=artist_name, track=track_name, artist_info=artist_info)
     
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with track_generation(station_id, "chat"):
+            response = openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}]
+            )
         return response.choices[0].message.content.strip()
     except Exception as e:
         return f"Si {artist_name} ay isa sa mga pinakasikat na OPM artist ngayon! Suportahan natin ang kanilang bagong kanta {track_name}!"
@@ -318,23 +526,19 @@ def upload_playlist_cover_image(sp, playlist_id, image_bytes):
         st.error(f"Error uploading playlist cover: {e}")
         return False
 
-def generate_playlist_cover_art(mood, playlist_name):
+def generate_playlist_cover_art(mood, playlist_name, size="1024x1024", station_id=None):
     """Generate cover art specifically for the playlist"""
-    prompt = f"""
-    Create a vibrant playlist cover for "{playlist_name}". 
-    Style: {mood}, Filipino-inspired, modern design, music themed.
-    Include musical elements like notes, instruments, or sound waves.
-    Colors: Bright and appealing, suitable for a music playlist cover.
-    Format: Square album cover style, professional quality.
-    """
+    prompt = PLAYLIST_COVER_PROMPT.format(mood=mood, playlist_name=playlist_name)
     
     try:
-        response = openai.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            n=1,
-            size="1024x1024"
-        )
+        model = "dall-e-3" if size == "1024x1024" else "dall-e-2"
+        with track_generation(station_id, "image_1024" if size == "1024x1024" else "image_512"):
+            response = openai.images.generate(
+                model=model,
+                prompt=prompt,
+                n=1,
+                size=size
+            )
         img_url = response.data[0].url
         img_response = requests.get(img_url)
         return img_response.content
@@ -350,29 +554,21 @@ def get_multiple_omp_tracks(sp, mood_description, count=5):
     # Diverse search strategies for variety including indie/small artist discovery
     search_strategies = [
         # Strategy 1: Use original mood
-        lambda: search_spotify_by_mood(sp, mood_description),
+        lambda: search_spotify_by_mood(sp, mood_description, exclude_ids=track_ids_seen),
         
         # Strategy 2: Search by popular OPM artists
-        lambda: search_by_random_opm_artist(sp),
+        lambda: search_by_random_opm_artist(sp, exclude_ids=track_ids_seen),
         
         # Strategy 3: Discover indie/underground artists (30% chance)
-        lambda: discover_indie_opm_artists(sp),
-        lambda: discover_emerging_opm_artists(sp),
-        lambda: search_by_independent_labels(sp),
-        lambda: search_regional_opm_scenes(sp),
-        
-        # Strategy 4: Search different moods
-        lambda: search_spotify_by_mood(sp, "masayang pop song"),
-        lambda: search_spotify_by_mood(sp, "romantic ballad"),
-        lambda: search_spotify_by_mood(sp, "energetic rock"),
-        lambda: search_spotify_by_mood(sp, "chill acoustic"),
-        lambda: search_spotify_by_mood(sp, "dance party song"),
-        
-        # Strategy 5: Search by genre
-        lambda: search_opm_by_genre(sp, "OPM rock"),
-        lambda: search_opm_by_genre(sp, "Filipino pop"),
-        lambda: search_opm_by_genre(sp, "Pinoy alternative"),
+        lambda: discover_indie_opm_artists(sp, exclude_ids=track_ids_seen),
+        lambda: discover_emerging_opm_artists(sp, exclude_ids=track_ids_seen),
+        lambda: search_by_independent_labels(sp, exclude_ids=track_ids_seen),
+        lambda: search_regional_opm_scenes(sp, exclude_ids=track_ids_seen),
     ]
+    # Strategy 4: Search different moods
+    search_strategies += [lambda mood=mood: search_spotify_by_mood(sp, mood, exclude_ids=track_ids_seen) for mood in VARIETY_MOODS]
+    # Strategy 5: Search by genre
+    search_strategies += [lambda genre=genre: search_opm_by_genre(sp, genre, exclude_ids=track_ids_seen) for genre in GENRE_QUERIES]
     
     # Try each strategy until we get enough unique tracks
     for strategy in search_strategies:
@@ -389,99 +585,83 @@ def get_multiple_omp_tracks(sp, mood_description, count=5):
     
     return tracks
 
-def search_by_random_opm_artist(sp):
+def search_by_random_opm_artist(sp, exclude_ids=None):
     """Search for tracks by randomly selecting from popular OPM artists"""
-    import random
-    
-    opm_artists = [
-        'Ben&Ben', 'Moira Dela Torre', 'December Avenue', 'The Juans',
-        'IV of Spades', 'Unique Salonga', 'SB19', 'BINI', 'Parokya ni Edgar',
-        'Rivermaya', 'Eraserheads', 'Bamboo', 'Sponge Cola', 'Silent Sanctuary',
-        'Kamikazee', 'Callalily', 'Moonstar88', 'Itchyworms', 'Orange and Lemons',
-        'Hale', 'Urbandub', 'Typecast', 'Chicosci', 'Sandwich', 'Teeth',
-        'Yeng Constantino', 'Sarah Geronimo', 'Regine Velasquez', 'Gary Valenciano'
-    ]
+    # Pick the artist first so every call can land on a different artist, then reuse its bucket
+    artist = random.choice(OPM_ARTISTS)
+    bucket = f"artist:{artist}"
+    track = get_candidate_pool().draw(bucket, exclude_ids)
+    if track:
+        return track
     
-    artist = random.choice(opm_artists)
     try:
         results = sp.search(q=f'artist:"{artist}"', type='track', limit=20, market='PH')
         if results['tracks']['items']:
-            return random.choice(results['tracks']['items'])
+            get_candidate_pool().add(bucket, results['tracks']['items'], source=f'artist:{artist}')
+            return get_candidate_pool().draw(bucket, exclude_ids)
     except:
         pass
     return None
 
-def search_opm_by_genre(sp, genre_query):
+def search_opm_by_genre(sp, genre_query, exclude_ids=None):
     """Search OPM by specific genre"""
+    bucket = f"genre:{genre_query}"
+    track = get_candidate_pool().draw(bucket, exclude_ids)
+    if track:
+        return track
+    
     try:
         results = sp.search(q=genre_query, type='track', limit=50, market='PH')
         if results['tracks']['items']:
-            import random
-            return random.choice(results['tracks']['items'])
+            get_candidate_pool().add(bucket, results['tracks']['items'], source=genre_query)
+            return get_candidate_pool().draw(bucket, exclude_ids)
     except:
         pass
     return None
 
-def discover_indie_opm_artists(sp):
+def discover_indie_opm_artists(sp, exclude_ids=None):
     """Discover small/indie OPM artists with low visibility"""
     try:
-        import random
-        
-        # Search strategies for indie/underground OPM
-        indie_search_terms = [
-            '"filipino indie" market:PH',
-            '"pinoy underground" market:PH', 
-            '"manila music scene" market:PH',
-            '"quezon city bands" market:PH',
-            '"OPM indie" market:PH',
-            '"pinoy DIY" market:PH',
-            '"filipino alternative" market:PH',
-            '"independent filipino" market:PH'
-        ]
+        track = get_candidate_pool().draw("indie", exclude_ids)
+        if track:
+            return track
         
         indie_tracks = []
         
-        for search_term in indie_search_terms:
+        for search_term in INDIE_SEARCH_TERMS:
             try:
                 results = sp.search(q=search_term, type='track', limit=50, market='PH')
                 if results['tracks']['items']:
-                    # Filter for low-popularity tracks (under 30 popularity score)
+                    # Filter for low-popularity tracks
                     low_popularity_tracks = [
                         track for track in results['tracks']['items']
-                        if track['popularity'] < 30
+                        if track['popularity'] < INDIE_MAX_POPULARITY
                     ]
                     indie_tracks.extend(low_popularity_tracks)
             except:
                 continue
         
-        # Remove duplicates and return random track
+        # Pool de-duplicates, then return random track
         if indie_tracks:
-            unique_tracks = {track['id']: track for track in indie_tracks}
-            return random.choice(list(unique_tracks.values()))
+            get_candidate_pool().add("indie", indie_tracks, source='indie search')
+            return get_candidate_pool().draw("indie", exclude_ids)
             
         return None
         
     except Exception as e:
         return None
 
-def search_by_independent_labels(sp):
+def search_by_independent_labels(sp, exclude_ids=None):
     """Search for artists from independent Filipino labels"""
     try:
-        import random
-        
-        # Key independent Filipino labels
-        indie_labels = [
-            'O/C Records',
-            'PolyEast Records', 
-            'Music Colony Records',
-            'Downtown Q',
-            'LIAB Studios',
-            'Tarsier Records',
-            'Offshore Music',
-            'Careless Music Manila'
-        ]
-        
-        for label in indie_labels:
+        # Visit labels in random order so stations don't all drain the same label's bucket
+        for label in random.sample(INDIE_LABELS, len(INDIE_LABELS)):
+            # Prefer tracks with lower popularity
+            bucket = f"label:{label}"
+            track = get_candidate_pool().draw(bucket, exclude_ids, key=lowest_popularity)
+            if track:
+                return track
+            
             try:
                 # Search for tracks associated with these labels
                 results = sp.search(q=f'label:"{label}" market:PH', type='track', limit=20, market='PH')
@@ -490,9 +670,10 @@ def search_by_independent_labels(sp):
                     results = sp.search(q=f'"{label}" filipino music', type='track', limit=20, market='PH')
                 
                 if results['tracks']['items']:
-                    # Prefer tracks with lower popularity
-                    tracks = sorted(results['tracks']['items'], key=lambda x: x['popularity'])
-                    return tracks[0] if tracks else None
+                    get_candidate_pool().add(bucket, results['tracks']['items'], source=label)
+                    track = get_candidate_pool().draw(bucket, exclude_ids, key=lowest_popularity)
+                    if track:
+                        return track
                     
             except:
                 continue
@@ -502,84 +683,57 @@ def search_by_independent_labels(sp):
     except Exception as e:
         return None
 
-def discover_emerging_opm_artists(sp):
+def discover_emerging_opm_artists(sp, exclude_ids=None):
     """Find emerging OPM artists with recent releases and low popularity"""
     try:
-        import random
-        from datetime import datetime, timedelta
-        
-        # Search for recent releases in Philippines
-        current_year = datetime.now().year
-        last_year = current_year - 1
-        
-        emerging_search_terms = [
-            f'"OPM" year:{current_year} market:PH',
-            f'"filipino music" year:{current_year} market:PH',
-            f'"pinoy artist" year:{last_year}-{current_year} market:PH',
-            f'genre:"philippines-opm" year:{last_year}-{current_year}'
-        ]
+        track = get_candidate_pool().draw("emerging", exclude_ids)
+        if track:
+            return track
         
         emerging_tracks = []
         
-        for search_term in emerging_search_terms:
+        for search_term in emerging_search_terms():
             try:
                 results = sp.search(q=search_term, type='track', limit=50, market='PH')
                 if results['tracks']['items']:
                     # Filter for very low popularity (emerging artists)
                     very_new_tracks = [
                         track for track in results['tracks']['items']
-                        if track['popularity'] < 25  # Very low popularity threshold
+                        if track['popularity'] < EMERGING_MAX_POPULARITY
                     ]
                     emerging_tracks.extend(very_new_tracks)
             except:
                 continue
         
         if emerging_tracks:
-            # Remove duplicates and prioritize newest releases
-            unique_tracks = {track['id']: track for track in emerging_tracks}
-            tracks_list = list(unique_tracks.values())
-            
-            # Sort by release date (newest first) and popularity (lowest first)
-            sorted_tracks = sorted(tracks_list, 
-                                 key=lambda x: (x['album']['release_date'], x['popularity']), 
-                                 reverse=True)
-            
-            return random.choice(sorted_tracks[:10])  # Pick from top 10 newest/lowest popularity
+            # Pool the top 10 newest/lowest popularity and pick from them
+            get_candidate_pool().add("emerging", newest_lowest_popularity(emerging_tracks), source='emerging search')
+            return get_candidate_pool().draw("emerging", exclude_ids)
             
         return None
         
     except Exception as e:
         return None
 
-def search_regional_opm_scenes(sp):
+def search_regional_opm_scenes(sp, exclude_ids=None):
     """Discover artists from specific Filipino regional music scenes"""
     try:
-        import random
-        
-        # Regional music scenes and venues
-        regional_terms = [
-            '"route 196" manila',  # Famous indie venue
-            '"mows bar" quezon city',
-            '"saguijo" makati',
-            '"b-side" the collective',
-            '"cebu music scene"',
-            '"davao indie"',
-            '"baguio musicians"',
-            '"iloilo bands"',
-            '"bacolod music"'
-        ]
-        
-        for term in regional_terms:
+        track = get_candidate_pool().draw("regional", exclude_ids)
+        if track:
+            return track
+        
+        for term in REGIONAL_TERMS:
             try:
                 results = sp.search(q=f'{term} filipino', type='track', limit=30, market='PH')
                 if results['tracks']['items']:
                     # Filter for lower popularity regional artists
                     regional_tracks = [
                         track for track in results['tracks']['items']
-                        if track['popularity'] < 35
+                        if track['popularity'] < REGIONAL_MAX_POPULARITY
                     ]
                     if regional_tracks:
-                        return random.choice(regional_tracks)
+                        get_candidate_pool().add("regional", regional_tracks, source=term)
+                        return get_candidate_pool().draw("regional", exclude_ids)
             except:
                 continue
                 
@@ -588,33 +742,314 @@ def search_regional_opm_scenes(sp):
     except Exception as e:
         return None
 
+# Spotify OAuth scope and how early (seconds) tokens are refreshed before they expire
+SPOTIFY_SCOPE = "user-read-playback-state user-library-modify playlist-modify-public playlist-modify-private ugc-image-upload"
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300
+# Users who haven't used their Spotify client for this long (seconds) are dropped from the credential store
+SPOTIFY_IDLE_EVICTION = int(os.getenv("SPOTIFY_IDLE_EVICTION") or st.secrets.get("SPOTIFY_IDLE_EVICTION", 12 * 3600))
+
+def get_spotify_oauth():
+    """Build the OAuth helper; tokens live in the credential store, not spotipy's shared .cache file"""
+    return SpotifyOAuth(
+        client_id=SPOTIPY_CLIENT_ID,
+        client_secret=SPOTIPY_CLIENT_SECRET,
+        redirect_uri=SPOTIPY_REDIRECT_URI,
+        scope=SPOTIFY_SCOPE,
+        cache_handler=MemoryCacheHandler()
+    )
+
+# How long (seconds) an OAuth `state` handed out with the sign-in link stays valid
+OAUTH_STATE_TTL = 600
+
+@st.cache_resource
+def get_oauth_states():
+    """OAuth `state` values handed out and not yet used: state -> (issued_at, station key to resume)"""
+    return {"lock": threading.Lock(), "states": {}}
+
+def issue_oauth_state(station_id):
+    """Random single-use `state` for a sign-in link, remembering which station the session asked for"""
+    pending = get_oauth_states()
+    state = secrets.token_urlsafe(32)
+    now = time.time()
+    with pending["lock"]:
+        for expired in [s for s, (issued_at, _) in pending["states"].items() if now - issued_at > OAUTH_STATE_TTL]:
+            del pending["states"][expired]
+        pending["states"][state] = (now, station_id)
+    return state
+
+def consume_oauth_state(state):
+    """Check a callback's `state`; returns (valid, station key to resume), and a state only works once"""
+    pending = get_oauth_states()
+    with pending["lock"]:
+        entry = pending["states"].pop(state, None) if state else None
+    if entry is None or time.time() - entry[0] > OAUTH_STATE_TTL:
+        return False, None
+    return True, entry[1]
+
+@st.cache_resource
+def get_spotify_credential_store():
+    """Per-user Spotify token info and clients, shared across sessions and refreshed in the background"""
+    # "lock" guards the dicts only; each user's refresh is serialized by their own lock in "refresh_locks"
+    store = {"lock": threading.Lock(), "refresh_locks": {}, "users": {}}
+    threading.Thread(target=refresh_spotify_tokens_forever, args=(store,), daemon=True).start()
+    return store
+
+def token_expires_soon(token_info, margin=SPOTIFY_TOKEN_REFRESH_MARGIN):
+    """Check whether a token is expired or will be within the margin"""
+    return token_info.get('expires_at', 0) - time.time() < margin
+
+def store_spotify_token(token_info):
+    """Register a freshly authorized token and return the Spotify user id it belongs to"""
+    client = spotipy.Spotify(auth=token_info['access_token'])
+    user_id = client.current_user()['id']
+    store = get_spotify_credential_store()
+    with store["lock"]:
+        store["users"][user_id] = {"token_info": token_info, "client": client, "last_used": time.time()}
+    return user_id
+
+def refresh_spotify_token(store, user_id):
+    """Refresh one user's token and atomically swap in a client that uses it"""
+    with store["lock"]:
+        refresh_lock = store["refresh_locks"].setdefault(user_id, threading.Lock())
+    # Only callers refreshing the same user wait on each other
+    with refresh_lock:
+        with store["lock"]:
+            entry = store["users"].get(user_id)
+        if entry is None:
+            return False
+        # Another caller may have refreshed while we waited for the lock
+        if not token_expires_soon(entry["token_info"]):
+            return True
+        
+        try:
+            token_info = get_spotify_oauth().refresh_access_token(entry["token_info"]['refresh_token'])
+        except Exception as e:
+            print(f"Spotify token refresh failed for {user_id}: {e}")
+            return False
+        
+        client = spotipy.Spotify(auth=token_info['access_token'])
+        with store["lock"]:
+            # The user may have been evicted while the refresh was in flight
+            current = store["users"].get(user_id)
+            if current is None:
+                return False
+            store["users"][user_id] = dict(current, token_info=token_info, client=client)
+        return True
+
+def refresh_spotify_tokens_forever(store, interval=60):
+    """Background loop that refreshes active users' tokens before they expire and evicts idle users"""
+    while True:
+        with store["lock"]:
+            idle_cutoff = time.time() - SPOTIFY_IDLE_EVICTION
+            for user_id in [uid for uid, entry in store["users"].items() if entry["last_used"] < idle_cutoff]:
+                del store["users"][user_id]
+                store["refresh_locks"].pop(user_id, None)
+            due = [user_id for user_id, entry in store["users"].items() if token_expires_soon(entry["token_info"])]
+        for user_id in due:
+            refresh_spotify_token(store, user_id)
+        time.sleep(interval)
+
+def get_spotify_credentials(user_id):
+    """Current credential entry for a user, refreshed if due, or None if they need to authorize again"""
+    if not user_id:
+        return None
+    store = get_spotify_credential_store()
+    with store["lock"]:
+        entry = store["users"].get(user_id)
+        if entry is not None:
+            entry["last_used"] = time.time()
+    if entry is None:
+        return None
+    
+    # Only refresh inline if the background refresh fell behind
+    if token_expires_soon(entry["token_info"], margin=0):
+        if not refresh_spotify_token(store, user_id):
+            return None
+        with store["lock"]:
+            entry = store["users"].get(user_id)
+    return entry
+
+def get_spotify_client(user_id):
+    """Current Spotify client for a user, or None if they need to authorize again"""
+    entry = get_spotify_credentials(user_id)
+    return entry["client"] if entry else None
+
+def get_spotify_access_token(user_id):
+    """Current Spotify access token for a user, for clients that call the Web API directly"""
+    entry = get_spotify_credentials(user_id)
+    return entry["token_info"]["access_token"] if entry else None
+
+# Station engine backends: the engine drives the show, these functions do the I/O
+def station_spotify(station):
+    """Spotify client for the station's listener, picking up tokens refreshed in the background"""
+    sp = get_spotify_client(station.user_id)
+    if sp is None:
+        raise StationError("Spotify authorization expired. Please reconnect.")
+    return sp
+
+def station_add_tracks(station, tracks):
+    sp = station_spotify(station)
+    for track in tracks:
+        add_track_to_playlist(sp, station.playlist_id, track['id'])
+
+def station_cover_art(station, tier):
+    # Skipped when the budget is exhausted
+    if tier == "minimal":
+        return None
+    size = "1024x1024" if tier == "full" else "512x512"
+    return generate_playlist_cover_art(station.mood, station.playlist_name, size=size, station_id=station.station_id)
+
+def station_marketing_script(station, track, tier):
+    artist_name = track['artists'][0]['name']
+    if tier == "minimal":
+        return script_bank_marketing_script(artist_name, track['name'])
+    # Search for artist info using Tavily
+    artist_info = search_artist_info(artist_name, use_web_search=(tier == "full"), station_id=station.station_id)
+    return generate_artist_marketing_script(artist_name, track['name'], artist_info, station_id=station.station_id)
+
+def station_intro_audio(station, track, marketing_script, is_indie):
+    return assemble_dj_intro(track['name'], track['artists'][0]['name'], marketing_script, is_indie, station_id=station.station_id)
+
+def station_artwork(station, track, tier):
+    # Real album art by default; AI art only when opted in and the budget allows
+    if station.options.get("ai_album_art") and tier != "minimal":
+        image_size = "1024x1024" if tier == "full" else "512x512"
+        album_art = get_ai_artwork(track, image_size=image_size, station_id=station.station_id)
+        if album_art:
+            return album_art, AI_ARTWORK_CAPTION
+    return get_track_artwork(track), "Album Art"
+
+def station_load_segment(station, track, ref):
+    """Rebuild a saved segment from the phrase and artwork caches instead of regenerating it"""
+    # Every phrase of the intro was synthesized before, so this normally reads only the segment cache
+    intro_audio = station_intro_audio(station, track, ref['marketing_script'], ref['is_indie'])
+    
+    artwork, caption = None, "Album Art"
+    if ref['artwork_caption'] == AI_ARTWORK_CAPTION:
+        artwork, caption = read_cached_artwork(f"ai:{track['id']}"), AI_ARTWORK_CAPTION
+    if not artwork:
+        artwork, caption = get_track_artwork(track), "Album Art"
+    return Segment(track, ref['marketing_script'], intro_audio, artwork, caption,
+                   ref['tier'], ref['is_indie'], ref['created_at'])
+
+# Live stations kept in memory; idle or least recently used ones are evicted and resume from their snapshot
+STATION_IDLE_TTL = int(os.getenv("STATION_IDLE_TTL") or st.secrets.get("STATION_IDLE_TTL", 2 * 3600))
+STATION_MAX_LIVE = int(os.getenv("STATION_MAX_LIVE") or st.secrets.get("STATION_MAX_LIVE", 200))
+
+@st.cache_resource
+def get_station_engine():
+    """One engine per process, shared by every session"""
+    # Pre-render the stock DJ phrases so even the first intro after a cold start only voices track-specific lines
+    threading.Thread(target=warm_dj_phrases, daemon=True).start()
+    return StationEngine(StationBackends(
+        create_playlist=lambda station, name: create_custom_playlist(station_spotify(station), name),
+        add_tracks=station_add_tracks,
+        upload_cover=lambda station, image: upload_playlist_cover_image(station_spotify(station), station.playlist_id, image),
+        select_tracks=lambda station, mood, count: get_multiple_omp_tracks(station_spotify(station), mood, count=count),
+        generate_script=lambda station: generate_dj_script(station_id=station.station_id),
+        stream_script=lambda station, on_mood: stream_dj_script(on_mood, station_id=station.station_id),
+        extract_mood=extract_mood_from_script,
+        marketing_script=station_marketing_script,
+        synthesize_intro=station_intro_audio,
+        cover_art=station_cover_art,
+        artwork=station_artwork,
+        choose_tier=lambda station: choose_generation_tier(station.station_id),
+        load_segment=station_load_segment,
+    ), idle_ttl=STATION_IDLE_TTL, max_stations=STATION_MAX_LIVE)
+
+# Saved station snapshots, so a reload or restart resumes the station instead of rebuilding it
+STATION_STORE_PATH = os.getenv("STATION_STORE_PATH") or st.secrets.get("STATION_STORE_PATH", ".cache/stations.db")
+STATION_SNAPSHOT_TTL = int(os.getenv("STATION_SNAPSHOT_TTL") or st.secrets.get("STATION_SNAPSHOT_TTL", 7 * 24 * 3600))
+
+@st.cache_resource
+def get_station_store():
+    return StationStore(STATION_STORE_PATH, ttl=STATION_SNAPSHOT_TTL)
+
+def station_cover_key(station):
+    """Artwork cache key of a station's playlist cover; a restarted station gets a new playlist and a new key"""
+    return f"cover:{station.station_id}:{station.playlist_id}"
+
+def save_station(engine, station_id):
+    """Persist the station's snapshot; the playlist cover goes to the artwork cache"""
+    try:
+        station = engine.get_station(station_id)
+        if station.cover and not read_cached_artwork(station_cover_key(station)):
+            write_cached_artwork(station_cover_key(station), station.cover)
+        get_station_store().save(engine.snapshot(station_id))
+    except Exception as e:
+        print(f"Could not save station {station_id}: {e}")
+
+def open_station(engine, station_id, user_id, latest=False):
+    """Station key this listener may tune to: their live or saved station, their latest one, or a fresh key.
+
+    A key that belongs to another listener is never reused.
+    """
+    try:
+        station = engine.get_station(station_id)
+    except StationError:
+        station = None
+    if station is not None:
+        return station_id if station.user_id == user_id else uuid.uuid4().hex
+    
+    resumed = resume_station(engine, station_id, user_id, latest=latest)
+    if resumed:
+        return resumed.station_id
+    # Keep a key nobody has used yet, so a new station can still start under it
+    return station_id if get_station_store().load(station_id) is None else uuid.uuid4().hex
+
+def resume_station(engine, station_id, user_id, latest=False):
+    """Load a listener's saved station into the engine with no upstream calls"""
+    store = get_station_store()
+    snapshot = store.load(station_id)
+    if snapshot is not None and snapshot.get("user_id") != user_id:
+        snapshot = None
+    if snapshot is None and latest:
+        snapshot = store.latest_for_user(user_id)
+    if snapshot is None:
+        return None
+    
+    station = engine.restore(snapshot)
+    station.cover = read_cached_artwork(station_cover_key(station))
+    return station
+
 def main():
     st.title("📻 AI Tagalog Radio")
     st.markdown("*Ang pinakamasayang radio station na may AI DJ!*")
     
     # Initialize session state
-    if 'spotify_token' not in st.session_state:
-        st.session_state.spotify_token = None
+    if 'spotify_user_id' not in st.session_state:
+        st.session_state.spotify_user_id = None
+    if 'station_id' not in st.session_state:
+        # The URL's station key only picks which station to resume once the listener has signed in
+        st.session_state.station_id = st.query_params.get("station") or uuid.uuid4().hex
     
-    # Spotify Authentication  
-    scope = "user-read-playback-state user-library-modify playlist-modify-public playlist-modify-private ugc-image-upload"
-    sp_oauth = SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope=scope
-    )
+    # Spotify Authentication
+    sp_oauth = get_spotify_oauth()
+    
+    # Tokens are kept fresh in the shared credential store; a missing client means re-authorize
+    sp = get_spotify_client(st.session_state.spotify_user_id)
+    if sp is None:
+        st.session_state.spotify_user_id = None
     
     # Check for auth code in URL parameters
     query_params = st.query_params
     auth_code = query_params.get("code")
     
-    if st.session_state.spotify_token is None:
+    if sp is None:
+        valid_state, requested_station = consume_oauth_state(query_params.get("state")) if auth_code else (False, None)
+        if auth_code and not valid_state:
+            # Callbacks whose state this server never issued, or already used, are ignored
+            st.query_params.clear()
+            st.error("This Spotify sign-in link has expired or was already used. Please connect again.")
+            auth_code = None
+        
         if auth_code:
             # Handle the callback automatically
             try:
                 token_info = sp_oauth.get_access_token(auth_code)
-                st.session_state.spotify_token = token_info['access_token']
+                st.session_state.spotify_user_id = store_spotify_token(token_info)
+                if requested_station:
+                    st.session_state.station_id = requested_station
                 # Clear the URL parameters after successful auth
                 st.query_params.clear()
                 st.success("Spotify connected!")
@@ -622,26 +1057,35 @@ def main():
             except Exception as e:
                 st.error(f"Authentication error: {e}")
         else:
-            # Show authorization link
-            auth_url = sp_oauth.get_authorize_url()
+            # Show authorization link with a random per-session state, checked on the callback
+            if 'oauth_state' not in st.session_state:
+                st.session_state.oauth_state = issue_oauth_state(st.session_state.station_id)
+            auth_url = sp_oauth.get_authorize_url(state=st.session_state.oauth_state)
             st.markdown("### 🎵 Connect to Spotify")
             st.markdown(f"[Click here to authorize Spotify access]({auth_url})")
     else:
         # Main app interface
-        sp = spotipy.Spotify(auth=st.session_state.spotify_token)
-        
         st.markdown("### 🎙️ AI Radio Station")
         st.markdown("*The AI DJ will create a custom playlist, generate scripts, and play continuous OPM radio!*")
         
-        # Initialize session state for radio
-        if 'radio_active' not in st.session_state:
-            st.session_state.radio_active = False
-        if 'playlist_id' not in st.session_state:
-            st.session_state.playlist_id = None
-        if 'current_track_index' not in st.session_state:
-            st.session_state.current_track_index = 0
-        if 'radio_tracks' not in st.session_state:
-            st.session_state.radio_tracks = []
+        # The session only remembers which station it is tuned to; the engine holds the state
+        engine = get_station_engine()
+        station_id = st.session_state.station_id
+        
+        # After a reload or restart, pick the listener's station back up from its saved snapshot;
+        # a new session without a station key of theirs resumes their latest station
+        first_run = 'station_resume_checked' not in st.session_state
+        station_id = st.session_state.station_id = open_station(
+            engine, station_id, st.session_state.spotify_user_id, latest=first_run)
+        st.session_state.station_resume_checked = True
+        st.query_params["station"] = station_id
+        
+        station = engine.get_station(station_id) if engine.has_station(station_id) else None
+        if 'ai_album_art' not in st.session_state:
+            st.session_state.ai_album_art = bool(station and station.options.get("ai_album_art"))
+        if station:
+            station.options["ai_album_art"] = st.session_state.ai_album_art
+        radio_active = bool(station and station.active and station.tracks)
         
         col1, col2 = st.columns([2, 1])
         
@@ -650,129 +1094,91 @@ def main():
             radio_col1, radio_col2 = st.columns(2)
             
             with radio_col1:
-                if not st.session_state.radio_active:
+                if not radio_active:
                     if st.button("🎵 Start AI Radio Station", type="primary", use_container_width=True):
                         with st.spinner("🤖 Starting AI Radio Station..."):
                             try:
-                                # Step 1: Create custom playlist
-                                st.markdown("**Step 1:** Creating your custom playlist...")
-                                playlist_name = f"AI Radio - {time.strftime('%Y-%m-%d %H:%M')}"
-                                playlist_id = create_custom_playlist(sp, playlist_name)
-                                st.session_state.playlist_id = playlist_id
-                                
-                                # Step 2: Generate initial DJ script to determine mood
-                                st.markdown("**Step 2:** DJ is preparing the show...")
-                                dj_script = generate_dj_script()
-                                mood = extract_mood_from_script(dj_script)
-                                
-                                # Step 3: Generate playlist cover art
-                                st.markdown("**Step 3:** Creating custom playlist cover art...")
-                                playlist_cover = generate_playlist_cover_art(mood, playlist_name)
+                                station = engine.create_station(
+                                    station_id,
+                                    user_id=st.session_state.spotify_user_id,
+                                    options={"ai_album_art": st.session_state.ai_album_art},
+                                    on_progress=st.markdown
+                                )
                                 
-                                # Step 4: Get multiple tracks for continuous play
-                                st.markdown("**Step 4:** Selecting OPM tracks for the show...")
-                                tracks = get_multiple_omp_tracks(sp, mood, count=5)
-                                
-                                if not tracks:
-                                    st.error("Could not find suitable tracks. Please try again.")
-                                    return
-                                
-                                # Step 5: Add tracks to playlist
-                                st.markdown("**Step 5:** Building your playlist...")
-                                for track in tracks:
-                                    if playlist_id:
-                                        add_track_to_playlist(sp, playlist_id, track['id'])
-                                
-                                # Step 6: Upload custom cover art
-                                if playlist_cover and playlist_id:
-                                    st.markdown("**Step 6:** Setting custom playlist cover...")
-                                    cover_uploaded = upload_playlist_cover_image(sp, playlist_id, playlist_cover)
-                                    if cover_uploaded:
+                                if station.cover and station.playlist_id:
+                                    if station.cover_uploaded:
                                         st.success("✅ Custom playlist cover uploaded!")
                                     else:
                                         st.warning("⚠️ Playlist created but cover upload failed")
                                 
-                                st.session_state.radio_tracks = tracks
-                                st.session_state.radio_active = True
-                                st.session_state.current_track_index = 0
-                                st.session_state.playlist_cover = playlist_cover  # Store for display
-                                
+                                save_station(engine, station_id)
                                 st.success("🎉 AI Radio Station is now live!")
                                 st.rerun()
                                 
+                            except StationError as e:
+                                st.error(str(e))
                             except Exception as e:
                                 st.error(f"Error starting radio: {e}")
             
             with radio_col2:
-                if st.session_state.radio_active:
+                if radio_active:
                     if st.button("⏹️ Stop Radio", type="secondary", use_container_width=True):
-                        st.session_state.radio_active = False
-                        st.session_state.current_track_index = 0
+                        engine.stop(station_id)
+                        save_station(engine, station_id)
                         st.success("Radio stopped!")
                         st.rerun()
             
+            def discard_current_segment():
+                # Artwork preference changed, so the current segment has to be rebuilt
+                if engine.has_station(station_id):
+                    engine.discard_segment(station_id)
+            
+            st.checkbox("🎨 AI-generated album art", key="ai_album_art", on_change=discard_current_segment,
+                        help="Generate DALL-E art for each track instead of showing the Spotify album cover")
+            
             # Radio Player Interface
-            if st.session_state.radio_active and st.session_state.radio_tracks:
-                current_track = st.session_state.radio_tracks[st.session_state.current_track_index]
-                
+            if radio_active:
                 st.markdown("---")
                 st.markdown("## 📻 Now Playing - AI Radio")
                 
                 # Generate content for current track
                 with st.spinner("🎙️ AI DJ is introducing the next song..."):
                     try:
-                        # Generate DJ script for this specific track
+                        segment = engine.current_segment(station_id)
+                        current_track = segment.track
                         artist_name = current_track['artists'][0]['name']
                         track_name = current_track['name']
                         
-                        # Search for artist info using Tavily
-                        artist_info = search_artist_info(artist_name)
-                        
-                        # Generate artist marketing script
-                        marketing_script = generate_artist_marketing_script(artist_name, track_name, artist_info)
-                        
-                        # Check if this is a small/indie artist (low popularity)
-                        is_indie_artist = current_track['popularity'] < 30
-                        indie_promo = ""
-                        if is_indie_artist:
-                            indie_promo = "Ito ay isang hidden gem mula sa isang talented indie artist na deserve ng mas maraming suporta! "
-                        
-                        # Generate TTS for marketing + intro
-                        full_intro = f"""Kamusta mga ka-tropa! Narito ang susunod nating kanta. 
-                        {indie_promo}{marketing_script} 
-                        Pakinggan natin ang {track_name} ni {artist_name}!"""
-                        
-                        tts_audio = generate_tts(full_intro)
-                        
-                        # Generate album art
-                        album_art = generate_album_art("vibrant OPM", track_name)
+                        # Build the upcoming track's segment while this one plays
+                        engine.prefetch(station_id)
+                        save_station(engine, station_id)
                         
                         # Display content
                         track_col1, track_col2 = st.columns([1, 1])
                         
                         with track_col1:
-                            if album_art:
-                                st.image(album_art, caption="AI Generated Album Art", width=300)
+                            if segment.artwork:
+                                st.image(segment.artwork, caption=segment.artwork_caption, width=300)
                         
                         with track_col2:
                             st.markdown(f"### 🎵 {track_name}")
                             st.markdown(f"**Artist:** {artist_name}")
                             
                             # Show indie artist badge
-                            if is_indie_artist:
+                            if segment.is_indie:
                                 st.markdown("🌟 **Indie/Emerging Artist** - *Support small OPM artists!*")
                                 st.markdown(f"**Popularity Score:** {current_track['popularity']}/100")
                             
-                            st.markdown(f"**Track {st.session_state.current_track_index + 1}** of {len(st.session_state.radio_tracks)}")
+                            st.markdown(f"**Track {station.current_index + 1}** of {len(station.tracks)}")
                             
                             # DJ Voice
-                            if tts_audio:
+                            if segment.intro_audio:
                                 st.markdown("### 🎙️ DJ Introduction")
-                                st.audio(tts_audio, format="audio/mp3")
+                                st.audio(segment.intro_audio, format="audio/mp3")
                         
                         # Marketing info
                         st.markdown("### 📰 Artist Spotlight")
-                        st.info(marketing_script)
+                        st.info(segment.marketing_script)
                         
                         # Spotify embed
                         st.markdown("### 🎧 Now Playing")
@@ -788,17 +1194,18 @@ def main():
                         nav_col1, nav_col2, nav_col3 = st.columns(3)
                         
                         with nav_col1:
-                            if st.button("⏮️ Previous Track") and st.session_state.current_track_index > 0:
-                                st.session_state.current_track_index -= 1
+                            if st.button("⏮️ Previous Track") and station.current_index > 0:
+                                engine.seek(station_id, -1)
                                 st.rerun()
                         
                         with nav_col2:
                             if st.button("🔄 Refresh Show"):
+                                engine.discard_segment(station_id)
                                 st.rerun()
                         
                         with nav_col3:
-                            if st.button("⏭️ Next Track") and st.session_state.current_track_index < len(st.session_state.radio_tracks) - 1:
-                                st.session_state.current_track_index += 1
+                            if st.button("⏭️ Next Track") and station.current_index < len(station.tracks) - 1:
+                                engine.seek(station_id, 1)
                                 st.rerun()
                         
                         # Store current track for sidebar actions
@@ -825,35 +1232,45 @@ def main():
                 st.code(share_url)
             
             # Show playlist info
-            if st.session_state.radio_active and st.session_state.playlist_id:
+            if radio_active and station.playlist_id:
                 st.markdown("### 📝 Your Playlist")
                 
                 # Show playlist cover if available
-                if hasattr(st.session_state, 'playlist_cover') and st.session_state.playlist_cover:
-                    st.image(st.session_state.playlist_cover, caption="Custom Playlist Cover", width=200)
+                if station.cover:
+                    st.image(station.cover, caption="Custom Playlist Cover", width=200)
                 
-                playlist_url = f"https://open.spotify.com/playlist/{st.session_state.playlist_id}"
+                playlist_url = f"https://open.spotify.com/playlist/{station.playlist_id}"
                 st.markdown(f"[View AI Radio Playlist on Spotify]({playlist_url})")
                 
                 if st.button("📋 Copy Playlist Link"):
                     st.code(playlist_url)
             
             # Radio stats
-            if st.session_state.radio_active and st.session_state.radio_tracks:
+            if radio_active:
                 st.markdown("### 📊 Radio Stats")
-                st.metric("Total Tracks", len(st.session_state.radio_tracks))
-                st.metric("Current Track", f"{st.session_state.current_track_index + 1}")
+                st.metric("Total Tracks", len(station.tracks))
+                st.metric("Current Track", f"{station.current_index + 1}")
                 
-                progress = (st.session_state.current_track_index + 1) / len(st.session_state.radio_tracks)
+                progress = (station.current_index + 1) / len(station.tracks)
                 st.progress(progress)
+                
+                # Generation budget
+                usage = get_generation_usage(station_id)
+                st.markdown("### 💸 Generation Budget")
+                st.metric("Generation Tier", (usage["station_tier"] or "full").title())
+                st.metric("Station Spend (1h)", f"${usage['station_spend']:.2f} / ${GENERATION_BUDGET_STATION_HOURLY:.2f}")
+                st.metric("Global Spend (1h)", f"${usage['global_spend']:.2f} / ${GENERATION_BUDGET_GLOBAL_HOURLY:.2f}")
+                st.metric("Calls In Flight", f"{usage['station_inflight']} / {GENERATION_MAX_INFLIGHT_STATION} station · {usage['global_inflight']} / {GENERATION_MAX_INFLIGHT} global")
+                st.metric("Latency vs Target", f"{usage['station_latency_pressure']:.0%} station · {usage['global_latency_pressure']:.0%} global")
+                st.caption(" · ".join(f"{tier}: {count}" for tier, count in usage["tier_counts"].items()))
             
             # Reset radio
-            if st.session_state.radio_active:
+            if radio_active:
                 if st.button("🔄 Reset Radio Station"):
-                    st.session_state.radio_active = False
-                    st.session_state.radio_tracks = []
-                    st.session_state.current_track_index = 0
-                    st.session_state.playlist_id = None
+                    engine.remove(station_id)
+                    get_station_store().delete(station_id)
+                    st.session_state.station_id = uuid.uuid4().hex
+                    st.session_state.current_track_id = None
                     st.success("Radio reset! Start a new station.")
                     st.rerun()
 
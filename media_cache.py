@@ -0,0 +1,107 @@
+"""On-disk caches for generated and downloaded media.
+
+Each cache is one directory of files named by a hash of their key. Files are
+written atomically and touched on every read, and the least recently used
+ones are deleted once the directory exceeds its size limit. The radio keeps
+artwork thumbnails and synthesized DJ phrases this way.
+"""
+import hashlib
+import io
+import os
+import uuid
+
+
+def prune_cache_dir(cache_dir, max_bytes):
+    """Delete least recently used files until a cache directory fits its size limit"""
+    try:
+        entries = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+
+
+class MediaCache:
+    """Size-capped LRU directory of media files, keyed by arbitrary strings"""
+
+    def __init__(self, directory, max_bytes, extension):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+    def path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{self.extension}")
+
+    def read(self, key):
+        """Cached bytes for a key, marking the file as recently used, or None"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def write(self, key, data):
+        """Store bytes under a key and prune the cache; write failures are only logged"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            path = self.path(key)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            prune_cache_dir(self.directory, self.max_bytes)
+        except OSError as e:
+            print(f"Cache write failed in {self.directory}: {e}")
+        return data
+
+
+def segment_key(voice, text):
+    """Segment cache key for one phrase spoken in one voice"""
+    return f"{voice}:{text}"
+
+
+def artwork_key(key, size):
+    """Artwork cache key for one image at one display size"""
+    return f"{key}_{size}"
+
+
+def artwork_thumbnail(image_bytes, size):
+    """Shrink an image to fit size x size and re-encode it as JPEG"""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='JPEG', quality=85, optimize=True)
+    return img_byte_arr.getvalue()
+
+
+def album_image_url(track, size):
+    """URL of the smallest album rendition that still covers the display size, else the largest one"""
+    images = track.get('album', {}).get('images') or []
+    if not images:
+        return None
+    large_enough = [image for image in images if (image.get('width') or 0) >= size]
+    if large_enough:
+        return min(large_enough, key=lambda image: image['width'])['url']
+    return max(images, key=lambda image: image.get('width') or 0)['url']
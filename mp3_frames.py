@@ -0,0 +1,68 @@
+"""Frame-level MP3 helpers for joining TTS segments without re-encoding.
+
+Segments from the same voice share one encoding, so their Layer III frames
+can be joined directly once ID3 tags and the Xing/Info header frame are removed.
+"""
+
+# MPEG audio Layer III bitrates (kbps) and sample rates, indexed by the frame header fields
+MP3_BITRATES = {
+    "mpeg1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "mpeg2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def mp3_frame_length(data, offset):
+    """Byte length of the Layer III frame starting at offset, or None if there is no valid header"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        return 144000 * MP3_BITRATES["mpeg1"][bitrate_index] // sample_rate + padding
+    return 72000 * MP3_BITRATES["mpeg2"][bitrate_index] // sample_rate + padding
+
+
+def mp3_audio_frames(data):
+    """Audio frames of an MP3 blob, without ID3 tags or the Xing/Info header frame"""
+    offset = 0
+    # Skip ID3v2 tag (10 byte header + synchsafe size)
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size
+    
+    frames = []
+    while offset < len(data):
+        length = mp3_frame_length(data, offset)
+        if not length:
+            break
+        frame = data[offset:offset + length]
+        # The Xing/Info frame describes the whole file, so it is wrong once files are joined
+        if not frames and (b"Xing" in frame[:64] or b"Info" in frame[:64]):
+            offset += length
+            continue
+        frames.append(frame)
+        offset += length
+    
+    if not frames:
+        return None
+    return b"".join(frames)
+
+
+def concatenate_mp3_segments(segments):
+    """Join MP3 segments from the same voice at frame level, without re-encoding"""
+    parts = []
+    for audio in segments:
+        if not audio:
+            continue
+        frames = mp3_audio_frames(audio)
+        # Fall back to the raw bytes if the frames could not be parsed; decoders resync on their own
+        parts.append(frames if frames else audio)
+    return b"".join(parts) if parts else None
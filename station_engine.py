@@ -0,0 +1,633 @@
+"""Headless AI radio station engine.
+
+The engine owns station state and the order of work (playlist, DJ script,
+track selection, per-track DJ segments) but none of the I/O. Spotify, LLM,
+TTS and image calls go through a StationBackends bundle. That way the same
+engine can drive the Streamlit app, background workers or benchmarks.
+
+Backend callables can be plain functions or coroutine functions. The sync
+API (create_station, current_segment, ...) calls plain functions in the
+caller's thread. The async API (acreate_station, acurrent_segment, ...)
+awaits coroutine functions and runs plain functions in worker threads. One
+event loop can therefore serve many stations at once.
+"""
+import asyncio
+import copy
+import inspect
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+class StationError(Exception):
+    """Raised when a station cannot be started or does not exist"""
+
+
+@dataclass
+class StationBackends:
+    """Pluggable I/O for the engine; every callable receives the StationState first"""
+    # Spotify
+    create_playlist: Callable      # (station, name) -> playlist_id or None
+    add_tracks: Callable           # (station, tracks) -> None
+    upload_cover: Callable         # (station, image_bytes) -> bool
+    select_tracks: Callable        # (station, mood, count) -> list of track dicts
+    # LLM
+    generate_script: Callable      # (station) -> DJ script text
+    extract_mood: Callable         # (script) -> mood description
+    marketing_script: Callable     # (station, track, tier) -> marketing copy
+    # TTS
+    synthesize_intro: Callable     # (station, track, marketing_script, is_indie) -> audio bytes or None
+    # Image
+    cover_art: Callable            # (station, tier) -> image bytes or None
+    artwork: Callable              # (station, track, tier) -> (image bytes or None, caption)
+    # Budget
+    choose_tier: Callable = lambda station: "full"
+    # Optional streaming LLM: (station, on_mood) -> DJ script text, calling on_mood(mood) once mid-stream
+    stream_script: Optional[Callable] = None
+    # Optional cache-only rebuild of a snapshotted segment: (station, track, ref) -> Segment or None
+    load_segment: Optional[Callable] = None
+
+
+@dataclass
+class Segment:
+    """Everything needed to present one track: DJ intro audio, copy and artwork"""
+    track: dict
+    marketing_script: str
+    intro_audio: Optional[bytes]
+    artwork: Optional[bytes]
+    artwork_caption: str
+    tier: str
+    is_indie: bool
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class StationState:
+    station_id: str
+    user_id: Optional[str] = None
+    playlist_name: str = ""
+    playlist_id: Optional[str] = None
+    dj_script: str = ""
+    mood: str = ""
+    tracks: list = field(default_factory=list)
+    current_index: int = 0
+    active: bool = False
+    cover: Optional[bytes] = None
+    cover_uploaded: bool = False
+    options: dict = field(default_factory=dict)
+    segments: dict = field(default_factory=dict)       # track id -> Segment
+    segment_refs: dict = field(default_factory=dict)   # track id -> snapshotted segment ref, loaded lazily
+
+    @property
+    def current_track(self):
+        if not self.tracks:
+            return None
+        return self.tracks[self.current_index]
+
+
+# StationState fields carried by snapshots; generated media is rebuilt or re-read from caches
+SNAPSHOT_FIELDS = ["station_id", "user_id", "playlist_name", "playlist_id", "dj_script",
+                   "mood", "tracks", "current_index", "active", "options"]
+
+# Segment fields kept in snapshots; the media is found again through the backends' caches
+SEGMENT_REF_FIELDS = ["marketing_script", "artwork_caption", "tier", "is_indie", "created_at"]
+
+# Mood used when a DJ script has no MOOD line
+DEFAULT_MOOD = "happy upbeat song"
+
+# Tracks below this Spotify popularity get the indie promo
+INDIE_POPULARITY_THRESHOLD = 30
+
+# "MOOD: ...", tolerating list numbering, markdown bold/headings and any case
+SCRIPT_FIELD_PATTERN = re.compile(
+    r"^[\s>#*_-]*(?:\d+[.)]\s*)?[*_]*\s*(INTRO|MOOD|HYPE)\s*[*_]*\s*:\s*[*_]*\s*(.*?)[\s*_]*$",
+    re.IGNORECASE,
+)
+
+
+class ScriptStreamParser:
+    """Incremental parser for INTRO/MOOD/HYPE scripts.
+
+    feed() takes text deltas as they stream in and returns the (field, value)
+    pairs whose lines have just been completed, so a caller can act on MOOD
+    while HYPE is still being generated. A field whose value is on the next
+    line is also recognized; only the first occurrence of each field counts.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self._buffer = ""
+        self._open_field = None
+
+    def feed(self, delta):
+        self.text += delta
+        self._buffer += delta
+        completed = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            completed += self._parse_line(line)
+        return completed
+
+    def close(self):
+        """Parse whatever is left once the stream has ended"""
+        line, self._buffer = self._buffer, ""
+        return self._parse_line(line)
+
+    def _parse_line(self, line):
+        match = SCRIPT_FIELD_PATTERN.match(line)
+        if match:
+            field, value = match.group(1).upper(), match.group(2).strip()
+            self._open_field = None if value else field
+            return self._record(field, value) if value else []
+        if self._open_field and line.strip():
+            field, self._open_field = self._open_field, None
+            return self._record(field, line.strip(" *_"))
+        return []
+
+    def _record(self, field, value):
+        if field in self.fields:
+            return []
+        self.fields[field] = value
+        return [(field, value)]
+
+
+class ScriptStream:
+    """One streamed DJ script, firing on_mood(mood) exactly once as soon as the mood is known.
+
+    If the stream fails after MOOD went out, the partial script is kept;
+    before that, fallback_script is used instead. A script without a MOOD
+    line still fires on_mood with default_mood.
+    """
+
+    def __init__(self, on_mood, fallback_script, default_mood=DEFAULT_MOOD):
+        self.on_mood = on_mood
+        self.fallback_script = fallback_script
+        self.default_mood = default_mood
+        self.parser = ScriptStreamParser()
+        self.mood_sent = False
+
+    def feed(self, delta):
+        self._emit(self.parser.feed(delta))
+
+    def finish(self, failed=False):
+        """Return the script, sending the mood now if the stream never produced one"""
+        if failed and not self.mood_sent:
+            self.parser = ScriptStreamParser()
+            self.parser.feed(self.fallback_script)
+        self._emit(self.parser.close())
+        if not self.mood_sent:
+            self._send_mood(self.parser.fields.get("MOOD", self.default_mood))
+        return self.parser.text.strip()
+
+    def _emit(self, fields):
+        for field, value in fields:
+            if field == "MOOD" and not self.mood_sent:
+                self._send_mood(value)
+
+    def _send_mood(self, mood):
+        self.mood_sent = True
+        self.on_mood(mood)
+
+
+def extract_script_mood(script, default_mood=DEFAULT_MOOD):
+    """MOOD field of a finished DJ script"""
+    parser = ScriptStreamParser()
+    parser.feed(script)
+    parser.close()
+    return parser.fields.get("MOOD", default_mood)
+
+
+def consume_script_stream(deltas, on_mood, fallback_script, default_mood=DEFAULT_MOOD):
+    """Read an iterable of script text deltas through a ScriptStream and return the script"""
+    stream = ScriptStream(on_mood, fallback_script, default_mood)
+    try:
+        for delta in deltas:
+            stream.feed(delta)
+    except Exception:
+        return stream.finish(failed=True)
+    return stream.finish()
+
+
+async def aconsume_script_stream(deltas, on_mood, fallback_script, default_mood=DEFAULT_MOOD):
+    """consume_script_stream for an async iterable of deltas"""
+    stream = ScriptStream(on_mood, fallback_script, default_mood)
+    try:
+        async for delta in deltas:
+            stream.feed(delta)
+    except Exception:
+        return stream.finish(failed=True)
+    return stream.finish()
+
+
+async def call_backend(fn, *args):
+    """Await a coroutine backend, or run a blocking one in a worker thread"""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def segment_ref(segment):
+    """Snapshot fields of a built segment, enough for load_segment to rebuild it from caches"""
+    return {name: getattr(segment, name) for name in SEGMENT_REF_FIELDS}
+
+
+class StationEngine:
+    def __init__(self, backends, max_workers=4, startup_workers=4, idle_ttl=None, max_stations=None):
+        self.backends = backends
+        self.idle_ttl = idle_ttl            # seconds a station may go unused before it is evicted
+        self.max_stations = max_stations    # least recently used stations are evicted beyond this
+        self._stations = OrderedDict()      # station_id -> StationState, least recently used first
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Station start-up gets its own threads so it never queues behind other stations' prefetches
+        self._startup_executor = ThreadPoolExecutor(max_workers=startup_workers)
+        self._pending = {}   # (station_id, track_id) -> concurrent Future or asyncio Task
+
+    # --- Station lifecycle -------------------------------------------------
+
+    def new_station(self, station_id=None, user_id=None, playlist_name=None, options=None):
+        """Register an empty station without doing any I/O"""
+        station = StationState(
+            station_id=station_id or uuid.uuid4().hex,
+            user_id=user_id,
+            playlist_name=playlist_name or f"AI Radio - {time.strftime('%Y-%m-%d %H:%M')}",
+            options=dict(options or {}),
+        )
+        self._register(station)
+        return station
+
+    def get_station(self, station_id):
+        with self._lock:
+            station = self._stations.get(station_id)
+            if station is not None:
+                self._touch(station_id)
+        if station is None:
+            raise StationError(f"Unknown station: {station_id}")
+        self.evict_idle()
+        return station
+
+    def has_station(self, station_id):
+        with self._lock:
+            return station_id in self._stations
+
+    def create_station(self, station_id=None, user_id=None, playlist_name=None, track_count=5,
+                       options=None, on_progress=None):
+        """Create the playlist, pick a mood and tracks, and go live"""
+        progress = on_progress or (lambda message: None)
+        b = self.backends
+        station = self.new_station(station_id, user_id, playlist_name, options)
+
+        started = {}
+        try:
+            progress("**Step 1:** Creating your custom playlist...")
+            station.playlist_id = b.create_playlist(station, station.playlist_name)
+
+            progress("**Step 2:** DJ is preparing the show...")
+            if b.stream_script:
+                # Cover art and track search start as soon as the MOOD line is out, while HYPE still streams
+                def on_mood(mood):
+                    if started:
+                        return
+                    station.mood = mood
+                    progress("**Step 3:** Creating custom playlist cover art...")
+                    started["cover"] = self._startup_executor.submit(b.cover_art, station, b.choose_tier(station))
+                    progress("**Step 4:** Selecting OPM tracks for the show...")
+                    started["tracks"] = self._startup_executor.submit(b.select_tracks, station, mood, track_count)
+
+                station.dj_script = b.stream_script(station, on_mood)
+                if not started:
+                    on_mood(b.extract_mood(station.dj_script))
+                station.cover = started["cover"].result()
+                tracks = started["tracks"].result()
+            else:
+                station.dj_script = b.generate_script(station)
+                station.mood = b.extract_mood(station.dj_script)
+
+                progress("**Step 3:** Creating custom playlist cover art...")
+                station.cover = b.cover_art(station, b.choose_tier(station))
+
+                progress("**Step 4:** Selecting OPM tracks for the show...")
+                tracks = b.select_tracks(station, station.mood, track_count)
+            if not tracks:
+                raise StationError("Could not find suitable tracks. Please try again.")
+
+            progress("**Step 5:** Building your playlist...")
+            if station.playlist_id:
+                b.add_tracks(station, tracks)
+            station.tracks = list(tracks)
+            station.current_index = 0
+            station.active = True
+
+            if station.cover and station.playlist_id:
+                progress("**Step 6:** Setting custom playlist cover...")
+                station.cover_uploaded = b.upload_cover(station, station.cover)
+            return station
+        except BaseException:
+            # A half-built station must not stay registered
+            for future in started.values():
+                future.cancel()
+            self.remove(station.station_id)
+            raise
+
+    async def acreate_station(self, station_id=None, user_id=None, playlist_name=None, track_count=5,
+                              options=None, on_progress=None):
+        """Async create_station; playlist creation, script and cover run concurrently where they can"""
+        progress = on_progress or (lambda message: None)
+        b = self.backends
+        station = self.new_station(station_id, user_id, playlist_name, options)
+
+        started = {}
+        try:
+            progress("**Step 1:** Creating your custom playlist...")
+            playlist_task = asyncio.create_task(call_backend(b.create_playlist, station, station.playlist_name))
+            started["playlist"] = playlist_task
+
+            progress("**Step 2:** DJ is preparing the show...")
+            loop = asyncio.get_running_loop()
+
+            def start_mood_work(mood):
+                if "tracks" in started:
+                    return
+                station.mood = mood
+                progress("**Step 3:** Creating custom playlist cover art...")
+                progress("**Step 4:** Selecting OPM tracks for the show...")
+                started["cover"] = asyncio.create_task(self._acover_art(station))
+                started["tracks"] = asyncio.create_task(call_backend(b.select_tracks, station, mood, track_count))
+
+            if b.stream_script:
+                # on_mood may fire from a worker thread when the streaming backend is blocking
+                def on_mood(mood):
+                    loop.call_soon_threadsafe(start_mood_work, mood)
+
+                station.dj_script = await call_backend(b.stream_script, station, on_mood)
+                await asyncio.sleep(0)
+            else:
+                station.dj_script = await call_backend(b.generate_script, station)
+            if "tracks" not in started:
+                start_mood_work(b.extract_mood(station.dj_script))
+
+            station.cover = await started["cover"]
+            tracks = await started["tracks"]
+            station.playlist_id = await playlist_task
+            if not tracks:
+                raise StationError("Could not find suitable tracks. Please try again.")
+
+            progress("**Step 5:** Building your playlist...")
+            if station.playlist_id:
+                await call_backend(b.add_tracks, station, tracks)
+            station.tracks = list(tracks)
+            station.current_index = 0
+            station.active = True
+
+            if station.cover and station.playlist_id:
+                progress("**Step 6:** Setting custom playlist cover...")
+                station.cover_uploaded = await call_backend(b.upload_cover, station, station.cover)
+            return station
+        except BaseException:
+            # A half-built station must not stay registered, nor its start-up tasks keep running
+            for task in started.values():
+                task.cancel()
+            await asyncio.gather(*started.values(), return_exceptions=True)
+            self.remove(station.station_id)
+            raise
+
+    async def _acover_art(self, station):
+        tier = await call_backend(self.backends.choose_tier, station)
+        return await call_backend(self.backends.cover_art, station, tier)
+
+    def stop(self, station_id):
+        """Take the station off air and rewind it; pending prefetches are cancelled"""
+        station = self.get_station(station_id)
+        station.active = False
+        station.current_index = 0
+        self._cancel_pending(station_id)
+        return station
+
+    def remove(self, station_id):
+        """Forget a station entirely"""
+        self._cancel_pending(station_id)
+        with self._lock:
+            self._last_used.pop(station_id, None)
+            return self._stations.pop(station_id, None)
+
+    def evict_idle(self):
+        """Forget stations unused for idle_ttl and the least recently used beyond max_stations.
+
+        Evicted stations can be restored from their last snapshot.
+        """
+        cutoff = time.time() - self.idle_ttl if self.idle_ttl else None
+        evicted = []
+        with self._lock:
+            for station_id in list(self._stations):
+                over_capacity = self.max_stations and len(self._stations) > self.max_stations
+                if not over_capacity and (cutoff is None or self._last_used[station_id] >= cutoff):
+                    break
+                del self._stations[station_id]
+                del self._last_used[station_id]
+                evicted.append(station_id)
+        for station_id in evicted:
+            self._cancel_pending(station_id)
+        return evicted
+
+    def _register(self, station):
+        with self._lock:
+            self._stations[station.station_id] = station
+            self._touch(station.station_id)
+        self.evict_idle()
+
+    def _touch(self, station_id):
+        # Caller holds self._lock
+        self._stations.move_to_end(station_id)
+        self._last_used[station_id] = time.time()
+
+    # --- Segments ----------------------------------------------------------
+
+    def current_segment(self, station_id):
+        """Segment for the current track, built now unless a prefetch already has it"""
+        station = self.get_station(station_id)
+        track = station.current_track
+        if track is None:
+            return None
+        return self._segment_for(station, track)
+
+    def seek(self, station_id, step):
+        """Move the current track by `step`, staying within the playlist; no I/O"""
+        station = self.get_station(station_id)
+        if station.tracks:
+            station.current_index = min(max(station.current_index + step, 0), len(station.tracks) - 1)
+        self._release_played(station)
+        return station
+
+    def next_segment(self, station_id):
+        """Advance to the next track if there is one and return its segment"""
+        self.seek(station_id, 1)
+        return self.current_segment(station_id)
+
+    def previous_segment(self, station_id):
+        """Go back one track if possible and return its segment"""
+        self.seek(station_id, -1)
+        return self.current_segment(station_id)
+
+    def prefetch(self, station_id, ahead=1):
+        """Build the next `ahead` segments in background threads"""
+        station = self.get_station(station_id)
+        for track in station.tracks[station.current_index + 1:station.current_index + 1 + ahead]:
+            key = (station_id, track['id'])
+            with self._lock:
+                if track['id'] in station.segments or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._build_and_store, station, track)
+
+    def discard_segment(self, station_id, track_id=None):
+        """Drop a cached segment so it is generated fresh next time"""
+        station = self.get_station(station_id)
+        track_id = track_id or (station.current_track or {}).get('id')
+        station.segments.pop(track_id, None)
+        station.segment_refs.pop(track_id, None)
+
+    async def acurrent_segment(self, station_id):
+        station = self.get_station(station_id)
+        track = station.current_track
+        if track is None:
+            return None
+        return await self._asegment_for(station, track)
+
+    async def anext_segment(self, station_id):
+        self.seek(station_id, 1)
+        return await self.acurrent_segment(station_id)
+
+    async def aprevious_segment(self, station_id):
+        self.seek(station_id, -1)
+        return await self.acurrent_segment(station_id)
+
+    async def aprefetch(self, station_id, ahead=1):
+        """Schedule the next `ahead` segments as tasks on the running event loop"""
+        station = self.get_station(station_id)
+        for track in station.tracks[station.current_index + 1:station.current_index + 1 + ahead]:
+            key = (station_id, track['id'])
+            with self._lock:
+                if track['id'] in station.segments or key in self._pending:
+                    continue
+                self._pending[key] = asyncio.create_task(self._abuild_and_store(station, track))
+
+    def _segment_for(self, station, track):
+        segment = station.segments.get(track['id'])
+        if segment:
+            return segment
+        ref = station.segment_refs.pop(track['id'], None)
+        if ref and self.backends.load_segment:
+            segment = self.backends.load_segment(station, track, ref)
+            if segment:
+                station.segments[track['id']] = segment
+                return segment
+        with self._lock:
+            pending = self._pending.get((station.station_id, track['id']))
+        if pending is not None and not isinstance(pending, asyncio.Task):
+            try:
+                return pending.result()
+            except Exception:
+                pass
+        return self._build_and_store(station, track)
+
+    async def _asegment_for(self, station, track):
+        segment = station.segments.get(track['id'])
+        if segment:
+            return segment
+        ref = station.segment_refs.pop(track['id'], None)
+        if ref and self.backends.load_segment:
+            segment = await call_backend(self.backends.load_segment, station, track, ref)
+            if segment:
+                station.segments[track['id']] = segment
+                return segment
+        with self._lock:
+            pending = self._pending.get((station.station_id, track['id']))
+        if pending is not None:
+            try:
+                if isinstance(pending, asyncio.Task):
+                    return await pending
+                return await asyncio.wrap_future(pending)
+            except Exception:
+                pass
+        return await self._abuild_and_store(station, track)
+
+    def _build_and_store(self, station, track):
+        try:
+            segment = self.build_segment(station, track)
+            station.segments[track['id']] = segment
+            return segment
+        finally:
+            with self._lock:
+                self._pending.pop((station.station_id, track['id']), None)
+
+    async def _abuild_and_store(self, station, track):
+        try:
+            segment = await self.abuild_segment(station, track)
+            station.segments[track['id']] = segment
+            return segment
+        finally:
+            with self._lock:
+                self._pending.pop((station.station_id, track['id']), None)
+
+    def build_segment(self, station, track):
+        """Run the backends for one track: budget tier, marketing copy, DJ intro audio, artwork"""
+        b = self.backends
+        tier = b.choose_tier(station)
+        is_indie = track.get('popularity', 0) < INDIE_POPULARITY_THRESHOLD
+        marketing_script = b.marketing_script(station, track, tier)
+        intro_audio = b.synthesize_intro(station, track, marketing_script, is_indie)
+        artwork, caption = b.artwork(station, track, tier)
+        return Segment(track, marketing_script, intro_audio, artwork, caption, tier, is_indie)
+
+    async def abuild_segment(self, station, track):
+        """Async build_segment; artwork is fetched while the intro is written and voiced"""
+        b = self.backends
+        tier = await call_backend(b.choose_tier, station)
+        is_indie = track.get('popularity', 0) < INDIE_POPULARITY_THRESHOLD
+        artwork_task = asyncio.create_task(call_backend(b.artwork, station, track, tier))
+        marketing_script = await call_backend(b.marketing_script, station, track, tier)
+        intro_audio = await call_backend(b.synthesize_intro, station, track, marketing_script, is_indie)
+        artwork, caption = await artwork_task
+        return Segment(track, marketing_script, intro_audio, artwork, caption, tier, is_indie)
+
+    def _release_played(self, station):
+        """Drop the media of already played tracks, keeping refs so seeking back reloads them from caches"""
+        played = {track['id'] for track in station.tracks[:station.current_index]}
+        for track_id in played.intersection(list(station.segments)):
+            segment = station.segments.pop(track_id, None)
+            if segment:
+                station.segment_refs[track_id] = segment_ref(segment)
+
+    def _cancel_pending(self, station_id):
+        with self._lock:
+            keys = [key for key in self._pending if key[0] == station_id]
+            pending = [self._pending.pop(key) for key in keys]
+        for future in pending:
+            future.cancel()
+
+    # --- Snapshots ---------------------------------------------------------
+
+    def snapshot(self, station_id):
+        """JSON-serializable copy of the station's state plus refs to its built segments (no media bytes)"""
+        station = self.get_station(station_id)
+        snapshot = copy.deepcopy({name: getattr(station, name) for name in SNAPSHOT_FIELDS})
+        segments = dict(station.segment_refs)
+        for track_id, segment in list(station.segments.items()):
+            segments[track_id] = segment_ref(segment)
+        snapshot["segments"] = copy.deepcopy(segments)
+        return snapshot
+
+    def restore(self, snapshot):
+        """Register a station from a snapshot without any upstream calls; segments load lazily"""
+        station = StationState(**copy.deepcopy({name: snapshot[name] for name in SNAPSHOT_FIELDS if name in snapshot}))
+        station.segment_refs = copy.deepcopy(snapshot.get("segments", {}))
+        if station.tracks:
+            station.current_index = min(max(station.current_index, 0), len(station.tracks) - 1)
+        self._register(station)
+        return station
@@ -0,0 +1,95 @@
+"""SQLite store for station snapshots, so stations survive reloads and restarts.
+
+Snapshots come from StationEngine.snapshot(): station state plus references to
+segments whose media lives in the local artwork/segment caches. They are stored
+as compressed JSON, keyed by station, and indexed by user and playlist.
+Expired rows are purged automatically.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Track fields the radio actually reads; everything else is dropped to keep snapshots small
+TRACK_FIELDS = ["id", "name", "popularity"]
+ALBUM_FIELDS = ["id", "name", "images"]
+
+
+def compact_track(track):
+    compact = {name: track[name] for name in TRACK_FIELDS if name in track}
+    compact["artists"] = [{"id": artist.get("id"), "name": artist.get("name")} for artist in track.get("artists", [])]
+    if "album" in track:
+        compact["album"] = {name: track["album"][name] for name in ALBUM_FIELDS if name in track["album"]}
+    return compact
+
+
+class StationStore:
+    def __init__(self, path, ttl=7 * 24 * 3600, purge_interval=3600):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS station_snapshots (
+                    station_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    playlist_id TEXT,
+                    data BLOB NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_user ON station_snapshots (user_id, updated_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_playlist ON station_snapshots (playlist_id)")
+        self.purge_expired()
+
+    def save(self, snapshot):
+        """Insert or replace a snapshot; each save extends its expiry"""
+        snapshot = dict(snapshot, tracks=[compact_track(track) for track in snapshot.get("tracks", [])])
+        data = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO station_snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (snapshot["station_id"], snapshot.get("user_id"), snapshot.get("playlist_id"), data, now, now + self.ttl),
+            )
+        if now - self._last_purge > self.purge_interval:
+            self.purge_expired()
+
+    def load(self, station_id):
+        return self._fetch_one("SELECT data FROM station_snapshots WHERE station_id = ? AND expires_at > ?",
+                               (station_id, time.time()))
+
+    def load_by_playlist(self, playlist_id):
+        return self._fetch_one("SELECT data FROM station_snapshots WHERE playlist_id = ? AND expires_at > ? "
+                               "ORDER BY updated_at DESC LIMIT 1", (playlist_id, time.time()))
+
+    def latest_for_user(self, user_id):
+        """Most recently saved unexpired snapshot for a user"""
+        return self._fetch_one("SELECT data FROM station_snapshots WHERE user_id = ? AND expires_at > ? "
+                               "ORDER BY updated_at DESC LIMIT 1", (user_id, time.time()))
+
+    def delete(self, station_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM station_snapshots WHERE station_id = ?", (station_id,))
+
+    def purge_expired(self):
+        """Delete expired snapshots and return how many were removed"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM station_snapshots WHERE expires_at <= ?", (time.time(),))
+        self._last_purge = time.time()
+        return cursor.rowcount
+
+    def _fetch_one(self, query, params):
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
@@ -0,0 +1,187 @@
+import asyncio
+import json
+from contextlib import contextmanager
+
+import httpx
+import pytest
+
+import async_backends
+import async_station
+from async_backends import AsyncBackends, retry_after_seconds
+from async_station import async_station_backends, create_async_station_engine
+from dj_content import DJ_PHRASES
+from media_cache import MediaCache, segment_key
+from station_engine import StationError, StationState
+from track_selection import CandidatePool
+
+SCRIPT = "INTRO: Kamusta!\nMOOD: chill acoustic\nHYPE: Tara na!"
+TRACKS = [
+    {"id": f"t{i}", "name": f"Track {i}", "popularity": 20 + i,
+     "artists": [{"id": f"a{i}", "name": f"Artist {i}"}],
+     "album": {"id": f"al{i}", "release_date": "2024-01-01",
+               "images": [{"url": f"https://img.example/{i}-640.jpg", "width": 640},
+                          {"url": f"https://img.example/{i}-300.jpg", "width": 300}]}}
+    for i in range(3)
+]
+
+
+def chat_stream(text):
+    chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+             "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+    return f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n"
+
+
+def fake_api(calls, stream_status=200):
+    def handler(request):
+        calls.append((request.method, request.url.host, request.url.path))
+        if request.url.host == "api.spotify.com":
+            assert request.headers["Authorization"] == "Bearer token-u1"
+            if request.url.path == "/v1/search":
+                return httpx.Response(200, json={"tracks": {"items": TRACKS}})
+            if request.url.path == "/v1/recommendations":
+                return httpx.Response(200, json={"tracks": TRACKS})
+            if request.url.path == "/v1/me":
+                return httpx.Response(200, json={"id": "u1"})
+            if request.url.path == "/v1/users/u1/playlists":
+                return httpx.Response(201, json={"id": "p1"})
+            return httpx.Response(201, json={"snapshot_id": "s"})
+        if request.url.path == "/v1/chat/completions":
+            body = json.loads(request.content)
+            if body.get("stream"):
+                if stream_status != 200:
+                    return httpx.Response(stream_status, json={"error": {"message": "bad request"}})
+                return httpx.Response(200, text=chat_stream(SCRIPT), headers={"Content-Type": "text/event-stream"})
+            return httpx.Response(200, json={
+                "id": "c", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Suportahan natin sila!"}}]})
+        if request.url.path == "/v1/audio/speech":
+            text = json.loads(request.content)["input"]
+            return httpx.Response(200, content=f"voice:{text}|".encode(), headers={"Content-Type": "audio/mpeg"})
+        if request.url.path == "/v1/images/generations":
+            return httpx.Response(200, json={"created": 0, "data": [{"url": "https://img.example/cover.png"}]})
+        if request.url.host == "api.tavily.com":
+            return httpx.Response(200, json={"results": [{"content": "Indie folk band"}]})
+        if request.url.host == "img.example":
+            return httpx.Response(200, content=b"image:" + request.url.path.encode())
+        return httpx.Response(404)
+    return handler
+
+
+def billing(recorded):
+    # Records a call only when it completes, like the app's budget tracker
+    @contextmanager
+    def track_generation(station_id, kind, units=1):
+        yield
+        recorded.append(kind)
+    return track_generation
+
+
+def test_engine_runs_a_station_on_the_async_backends(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_station, "artwork_thumbnail", lambda image_bytes, size: b"thumb:" + image_bytes)
+    calls = []
+    recorded = []
+    segment_cache = MediaCache(str(tmp_path / "segments"), 10 * 1024 * 1024, "mp3")
+    artwork_cache = MediaCache(str(tmp_path / "artwork"), 10 * 1024 * 1024, "jpg")
+
+    async def run():
+        engine, clients = await create_async_station_engine(
+            lambda user_id: f"token-{user_id}", "sk-test", "tvly-test", pool=CandidatePool(),
+            artwork_cache=artwork_cache, segment_cache=segment_cache, track_generation=billing(recorded),
+            transport=httpx.MockTransport(fake_api(calls)))
+        try:
+            warmed = [segment_cache.read(segment_key(async_station.SEGMENT_VOICE, text)) for text in DJ_PHRASES.values()]
+            station = await engine.acreate_station("s1", user_id="u1", track_count=2)
+            segment = await engine.acurrent_segment("s1")
+        finally:
+            await clients.aclose()
+        return warmed, station, segment
+
+    warmed, station, segment = asyncio.run(run())
+
+    assert all(warmed)
+    assert station.active and station.playlist_id == "p1"
+    assert station.mood == "chill acoustic"
+    assert station.dj_script == SCRIPT
+    assert station.cover == b"image:/cover.png"
+    assert len(station.tracks) == 2 and len({track["id"] for track in station.tracks}) == 2
+    track = station.current_track
+    assert segment.track == track
+    assert segment.marketing_script == "Suportahan natin sila!"
+    assert segment.intro_audio.startswith(f"voice:{DJ_PHRASES['greeting']}|".encode())
+    assert f"voice:Pakinggan natin ang {track['name']} ni {track['artists'][0]['name']}!|".encode() in segment.intro_audio
+    assert segment.intro_audio.endswith(f"voice:{DJ_PHRASES['station_id']}|".encode())
+    assert segment.artwork == f"thumb:image:/{track['id'][1:]}-300.jpg".encode()
+    # Stock phrases were synthesized once, at start-up, and served from the cache afterwards
+    speech_calls = [call for call in calls if call[2] == "/v1/audio/speech"]
+    assert len(speech_calls) == len(DJ_PHRASES) + 2
+    assert ("POST", "api.tavily.com", "/search") in calls
+    assert ("POST", "api.spotify.com", "/v1/playlists/p1/tracks") in calls
+    assert {"chat", "image_1024", "web_search", "tts_char"} <= set(recorded)
+
+
+def test_failed_script_stream_falls_back_without_billing(tmp_path):
+    recorded = []
+
+    async def run():
+        clients = AsyncBackends(lambda user_id: f"token-{user_id}", "sk-test",
+                                transport=httpx.MockTransport(fake_api([], stream_status=400)))
+        backends = async_station_backends(clients, CandidatePool(), MediaCache(str(tmp_path / "a"), 1024, "jpg"),
+                                          MediaCache(str(tmp_path / "s"), 1024, "mp3"),
+                                          track_generation=billing(recorded))
+        try:
+            return await backends.stream_script(StationState("s1", user_id="u1"), lambda mood: None)
+        finally:
+            await clients.aclose()
+
+    script = asyncio.run(run())
+
+    assert script == async_station.FALLBACK_DJ_SCRIPT
+    assert recorded == []
+
+
+def test_signed_out_listener_cannot_start_a_station(tmp_path):
+    async def run():
+        clients = AsyncBackends(lambda user_id: None, "sk-test",
+                                transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+        backends = async_station_backends(clients, CandidatePool(), MediaCache(str(tmp_path / "a"), 1024, "jpg"),
+                                          MediaCache(str(tmp_path / "s"), 1024, "mp3"))
+        try:
+            return await backends.select_tracks(StationState("s1", user_id="gone"), "chill", 2)
+        finally:
+            await clients.aclose()
+
+    with pytest.raises(StationError, match="authorization expired"):
+        asyncio.run(run())
+
+
+def test_retry_after_accepts_seconds_and_http_dates(monkeypatch):
+    monkeypatch.setattr(async_backends.time, "time", lambda: 784111777.0)
+
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds("Sun, 06 Nov 1994 08:49:42 GMT") == 5.0
+    assert retry_after_seconds("Sun, 06 Nov 1994 08:49:30 GMT") == 0.0
+    assert retry_after_seconds("soon") == 1.0
+    assert retry_after_seconds(None) == 1.0
+
+
+def test_rate_limited_requests_wait_for_an_http_date_retry_after(monkeypatch):
+    responses = [httpx.Response(429, headers={"Retry-After": "Sun, 06 Nov 1994 08:49:39 GMT"}),
+                 httpx.Response(200, json={"ok": True})]
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(async_backends.time, "time", lambda: 784111777.0)
+    monkeypatch.setattr(async_backends.asyncio, "sleep", sleep)
+
+    async def run():
+        http = async_backends.AsyncHTTP(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        try:
+            return await http.request("GET", "https://api.spotify.com/v1/me")
+        finally:
+            await http.aclose()
+
+    assert asyncio.run(run()).json() == {"ok": True}
+    assert slept == [2.0]
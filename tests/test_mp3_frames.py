@@ -0,0 +1,56 @@
+from mp3_frames import concatenate_mp3_segments, mp3_audio_frames, mp3_frame_length
+
+# MPEG-2 Layer III, 160 kbps, 24 kHz, mono: 72000 * 160 // 24000 = 480 bytes per frame
+HEADER = bytes([0xFF, 0xF3, 0xE4, 0xC4])
+PADDED_HEADER = bytes([0xFF, 0xF3, 0xE6, 0xC4])
+
+
+def frame(fill, header=HEADER, length=480):
+    return header + bytes([fill]) * (length - len(header))
+
+
+def xing_frame():
+    # MPEG-2 mono side info is 9 bytes, so the Xing tag sits at byte 13
+    body = bytes(9) + b"Xing" + bytes(480 - 4 - 9 - 4)
+    return HEADER + body
+
+
+def id3_tag(payload=b"TIT2 padding"):
+    size = len(payload)
+    synchsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + synchsafe + payload
+
+
+def test_frame_length_of_mpeg2_layer3_frame():
+    assert mp3_frame_length(frame(1), 0) == 480
+
+
+def test_frame_length_includes_padding_byte():
+    assert mp3_frame_length(frame(1, PADDED_HEADER, 481), 0) == 481
+
+
+def test_frame_length_rejects_invalid_headers():
+    assert mp3_frame_length(b"\x00\x00\x00\x00", 0) is None
+    # Free-format bitrate index 0 and reserved sample rate index 3
+    assert mp3_frame_length(bytes([0xFF, 0xF3, 0x04, 0xC4]), 0) is None
+    assert mp3_frame_length(bytes([0xFF, 0xF3, 0xEC, 0xC4]), 0) is None
+    # Truncated header
+    assert mp3_frame_length(HEADER[:3], 0) is None
+
+
+def test_audio_frames_strip_id3_and_xing():
+    audio = [frame(1), frame(2, PADDED_HEADER, 481)]
+    data = id3_tag() + xing_frame() + b"".join(audio)
+    assert mp3_audio_frames(data) == b"".join(audio)
+
+
+def test_audio_frames_without_frames_returns_none():
+    assert mp3_audio_frames(id3_tag() + b"not audio") is None
+
+
+def test_concatenate_keeps_only_audio_frames_in_order():
+    first = id3_tag() + xing_frame() + frame(1)
+    second = id3_tag() + xing_frame() + frame(2) + frame(3)
+    joined = concatenate_mp3_segments([first, None, second])
+    assert joined == frame(1) + frame(2) + frame(3)
+    assert b"ID3" not in joined and b"Xing" not in joined
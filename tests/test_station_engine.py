@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from station_engine import (DEFAULT_MOOD, Segment, StationBackends, StationEngine, StationError,
+                            aconsume_script_stream, consume_script_stream)
+
+FALLBACK = "INTRO: Kamusta!\nMOOD: masayang pop song\nHYPE: Tara!"
+
+
+def make_track(index, popularity=50):
+    return {"id": f"t{index}", "name": f"Track {index}", "popularity": popularity,
+            "artists": [{"id": f"a{index}", "name": f"Artist {index}"}]}
+
+
+def fake_backends(tracks, loaded=None):
+    def load_segment(station, track, ref):
+        if loaded is not None:
+            loaded.append(track["id"])
+        return Segment(track, ref["marketing_script"], b"audio", None, ref["artwork_caption"],
+                       ref["tier"], ref["is_indie"], ref["created_at"])
+
+    return StationBackends(
+        create_playlist=lambda station, name: "playlist",
+        add_tracks=lambda station, tracks: None,
+        upload_cover=lambda station, image: True,
+        select_tracks=lambda station, mood, count: tracks[:count],
+        generate_script=lambda station: "INTRO: Hi\nMOOD: chill\nHYPE: Go",
+        extract_mood=lambda script: "chill",
+        marketing_script=lambda station, track, tier: f"About {track['name']}",
+        synthesize_intro=lambda station, track, script, is_indie: b"audio",
+        cover_art=lambda station, tier: b"cover",
+        artwork=lambda station, track, tier: (b"art", "Album Art"),
+        load_segment=load_segment,
+    )
+
+
+def test_idle_stations_are_evicted():
+    engine = StationEngine(fake_backends([]), idle_ttl=60)
+    engine.new_station("old")
+    engine._last_used["old"] = time.time() - 120
+    engine.new_station("fresh")
+    assert not engine.has_station("old")
+    assert engine.has_station("fresh")
+
+
+def test_least_recently_used_station_is_evicted_beyond_capacity():
+    engine = StationEngine(fake_backends([]), max_stations=2)
+    engine.new_station("a")
+    engine.new_station("b")
+    engine.get_station("a")
+    engine.new_station("c")
+    assert engine.has_station("a") and engine.has_station("c")
+    assert not engine.has_station("b")
+
+
+def test_played_segments_are_released_and_reloaded_on_seek_back():
+    tracks = [make_track(i) for i in range(3)]
+    loaded = []
+    engine = StationEngine(fake_backends(tracks, loaded))
+    engine.create_station("s", user_id="u", track_count=3)
+    first = engine.current_segment("s")
+
+    engine.next_segment("s")
+    station = engine.get_station("s")
+    assert "t0" not in station.segments
+    assert station.segment_refs["t0"]["marketing_script"] == first.marketing_script
+
+    segment = engine.previous_segment("s")
+    assert loaded == ["t0"]
+    assert segment.marketing_script == first.marketing_script
+
+
+def test_startup_work_does_not_queue_behind_prefetches():
+    tracks = [make_track(i) for i in range(2)]
+    backends = fake_backends(tracks)
+    backends.stream_script = lambda station, on_mood: (on_mood("chill"), "MOOD: chill")[1]
+    engine = StationEngine(backends, max_workers=1)
+    release = threading.Event()
+    busy = engine._executor.submit(release.wait, 5)
+    try:
+        station = engine.create_station("s", user_id="u", track_count=2)
+        assert not busy.done()
+        assert [track["id"] for track in station.tracks] == ["t0", "t1"]
+    finally:
+        release.set()
+
+
+def failing_deltas(deltas):
+    yield from deltas
+    raise ConnectionError("stream dropped")
+
+
+def test_script_stream_sends_mood_once_before_the_stream_ends():
+    moods = []
+
+    def deltas():
+        yield "INTRO: Hi\nMOOD: chill"
+        yield " hugot\n"
+        assert moods == ["chill hugot"]
+        yield "HYPE: Go\nMOOD: other\n"
+
+    script = consume_script_stream(deltas(), moods.append, FALLBACK)
+    assert moods == ["chill hugot"]
+    assert script.startswith("INTRO: Hi")
+
+
+def test_script_stream_failure_before_mood_uses_fallback():
+    moods = []
+    script = consume_script_stream(failing_deltas(["INTRO: Hi\n"]), moods.append, FALLBACK)
+    assert script == FALLBACK
+    assert moods == ["masayang pop song"]
+
+
+def test_script_stream_failure_after_mood_keeps_partial_script():
+    moods = []
+    script = consume_script_stream(failing_deltas(["INTRO: Hi\nMOOD: chill\nHYPE: Ta"]), moods.append, FALLBACK)
+    assert script == "INTRO: Hi\nMOOD: chill\nHYPE: Ta"
+    assert moods == ["chill"]
+
+
+def test_async_script_stream_without_mood_sends_default():
+    moods = []
+
+    async def deltas():
+        yield "Just chatting, no fields"
+
+    script = asyncio.run(aconsume_script_stream(deltas(), moods.append, FALLBACK))
+    assert script == "Just chatting, no fields"
+    assert moods == [DEFAULT_MOOD]
+
+
+def test_failed_start_unregisters_the_station():
+    backends = fake_backends([])
+    backends.stream_script = lambda station, on_mood: (on_mood("chill"), "MOOD: chill")[1]
+
+    def select_tracks(station, mood, count):
+        raise StationError("Spotify authorization expired. Please reconnect.")
+
+    backends.select_tracks = select_tracks
+    engine = StationEngine(backends)
+    with pytest.raises(StationError):
+        engine.create_station("c", user_id="u")
+    assert not engine.has_station("c")
+
+
+def test_failed_async_start_cancels_start_up_tasks():
+    playlist_cancelled = asyncio.Event()
+    backends = fake_backends([make_track(0)])
+
+    async def create_playlist(station, name):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            playlist_cancelled.set()
+            raise
+
+    async def cover_art(station, tier):
+        raise RuntimeError("image service down")
+
+    backends.create_playlist = create_playlist
+    backends.cover_art = cover_art
+    engine = StationEngine(backends)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await engine.acreate_station("c", user_id="u")
+        return playlist_cancelled.is_set()
+
+    assert asyncio.run(run())
+    assert not engine.has_station("c")
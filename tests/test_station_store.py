@@ -0,0 +1,94 @@
+import time
+
+from station_engine import StationEngine
+from station_store import StationStore, compact_track
+from test_station_engine import fake_backends, make_track
+
+
+def full_track(index):
+    track = make_track(index)
+    track["artists"][0].update({"href": "https://api.spotify.com/artist", "genres": ["opm"]})
+    track["album"] = {"id": f"al{index}", "name": f"Album {index}", "release_date": "2024",
+                      "images": [{"url": f"https://img.example/{index}.jpg", "width": 640}]}
+    track.update({"available_markets": ["PH"] * 100, "preview_url": "https://p.example", "duration_ms": 1000})
+    return track
+
+
+def snapshot(station_id, user_id="u1", playlist_id="p1", tracks=()):
+    return {"station_id": station_id, "user_id": user_id, "playlist_id": playlist_id, "tracks": list(tracks),
+            "current_index": 0, "segments": {}}
+
+
+def test_compact_track_keeps_only_fields_the_radio_reads():
+    compact = compact_track(full_track(1))
+    assert compact == {
+        "id": "t1", "name": "Track 1", "popularity": 50,
+        "artists": [{"id": "a1", "name": "Artist 1"}],
+        "album": {"id": "al1", "name": "Album 1", "images": [{"url": "https://img.example/1.jpg", "width": 640}]},
+    }
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = StationStore(str(tmp_path / "stations.db"))
+    store.save(snapshot("s1", tracks=[full_track(1)]))
+    loaded = store.load("s1")
+    assert loaded["user_id"] == "u1"
+    assert loaded["tracks"] == [compact_track(full_track(1))]
+    assert store.load_by_playlist("p1")["station_id"] == "s1"
+    assert store.load("missing") is None
+
+
+def test_latest_for_user_returns_most_recently_saved(tmp_path, monkeypatch):
+    store = StationStore(str(tmp_path / "stations.db"))
+    now = time.time()
+    for offset, station_id in [(0, "old"), (10, "new"), (5, "middle")]:
+        monkeypatch.setattr(time, "time", lambda: now + offset)
+        store.save(snapshot(station_id))
+    store.save(snapshot("other", user_id="u2"))
+    assert store.latest_for_user("u1")["station_id"] == "new"
+    assert store.latest_for_user("nobody") is None
+
+
+def test_expired_snapshots_are_hidden_and_purged(tmp_path, monkeypatch):
+    store = StationStore(str(tmp_path / "stations.db"), ttl=60)
+    store.save(snapshot("s1"))
+    store.save(snapshot("s2", user_id="u2"))
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.load("s1") is None
+    assert store.latest_for_user("u1") is None
+    assert store.purge_expired() == 2
+
+
+def test_save_extends_expiry(tmp_path, monkeypatch):
+    store = StationStore(str(tmp_path / "stations.db"), ttl=60)
+    start = time.time()
+    store.save(snapshot("s1"))
+    monkeypatch.setattr(time, "time", lambda: start + 50)
+    store.save(snapshot("s1"))
+    monkeypatch.setattr(time, "time", lambda: start + 100)
+    assert store.load("s1") is not None
+
+
+def test_engine_snapshot_survives_store_and_restore(tmp_path):
+    tracks = [full_track(i) for i in range(3)]
+    engine = StationEngine(fake_backends(tracks))
+    engine.create_station("s1", user_id="u1", track_count=3, options={"ai_album_art": True})
+    built = engine.next_segment("s1")
+
+    store = StationStore(str(tmp_path / "stations.db"))
+    store.save(engine.snapshot("s1"))
+
+    loaded = []
+    restarted = StationEngine(fake_backends(tracks, loaded))
+    station = restarted.restore(store.load("s1"))
+    assert station.user_id == "u1" and station.playlist_id == "playlist"
+    assert station.active and station.current_index == 1
+    assert station.options == {"ai_album_art": True}
+    assert [track["id"] for track in station.tracks] == ["t0", "t1", "t2"]
+    assert station.tracks[0] == compact_track(tracks[0])
+
+    segment = restarted.current_segment("s1")
+    assert loaded == ["t1"]
+    assert segment.marketing_script == built.marketing_script
+    assert segment.created_at == built.created_at
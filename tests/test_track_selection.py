@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+
+import track_selection
+from track_selection import CandidatePool, aselect_opm_tracks
+
+
+def make_tracks(prefix, count, popularity=20):
+    return [{"id": f"{prefix}{i}", "name": f"Track {i}", "popularity": popularity + i,
+             "artists": [{"id": f"a{i}", "name": f"Artist {i}"}], "album": {"id": f"al{i}", "release_date": "2024-01-01"}}
+            for i in range(count)]
+
+
+class FakeSpotify:
+    def __init__(self):
+        self.searches = []
+
+    async def search_tracks(self, query, limit=20):
+        self.searches.append(query)
+        return make_tracks(f"{query}:", 3)
+
+    async def recommendations(self, seed_genres, limit=20, **targets):
+        raise httpx.HTTPError("recommendations unavailable")
+
+
+def test_pool_draws_each_track_once_and_skips_excluded_ids():
+    pool = CandidatePool()
+    pool.add("mood:chill", make_tracks("t", 3))
+
+    drawn = {pool.draw("mood:chill", exclude_ids={"t0"})["id"] for _ in range(2)}
+
+    assert drawn == {"t1", "t2"}
+    assert pool.draw("mood:chill", exclude_ids={"t0"}) is None
+    assert pool.draw("mood:chill")["id"] == "t0"
+
+
+def test_expired_candidates_are_dropped(monkeypatch):
+    pool = CandidatePool(ttl=60)
+    monkeypatch.setattr(track_selection.time, "time", lambda: 1000.0)
+    pool.add("indie", make_tracks("t", 2))
+
+    monkeypatch.setattr(track_selection.time, "time", lambda: 1061.0)
+
+    assert pool.draw("indie") is None
+
+
+def test_async_selection_returns_distinct_tracks_and_reuses_the_pool():
+    spotify = FakeSpotify()
+    pool = CandidatePool()
+
+    first = asyncio.run(aselect_opm_tracks(spotify, pool, "chill acoustic", 4))
+    searches = len(spotify.searches)
+    second = asyncio.run(aselect_opm_tracks(spotify, pool, "chill acoustic", 2))
+
+    assert len(first) == 4 and len({track["id"] for track in first}) == 4
+    assert len(second) == 2
+    assert len(spotify.searches) - searches < searches
@@ -0,0 +1,310 @@
+"""OPM track selection: the search catalog, the shared candidate pool and async search strategies.
+
+Every search harvests its whole result page into a pool bucket (per mood,
+artist, label, genre or discovery scene), and later picks are drawn from
+the bucket before Spotify is asked again. The sync strategies in main.py and
+the async ones here share this catalog and pool.
+"""
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+# Mood keywords -> (search terms, recommendation audio-feature targets); the first match wins
+MOOD_SEARCH_PLANS = [
+    (['masaya', 'happy', 'energetic'],
+     ['OPM happy', 'Filipino pop upbeat', 'Pinoy rock energetic'], {'valence': 0.8, 'energy': 0.7}),
+    (['romantic', 'love', 'ballad', 'hugot'],
+     ['OPM love songs', 'Filipino ballad', 'Pinoy romantic', 'hugot songs'], {'valence': 0.6, 'energy': 0.4}),
+    (['dance', 'sayaw', 'party', 'disco'],
+     ['OPM dance', 'Filipino party songs', 'Pinoy disco'], {'danceability': 0.8, 'energy': 0.8}),
+    (['sad', 'malungkot', 'emo'],
+     ['OPM sad', 'Filipino emotional', 'Pinoy emo'], {'valence': 0.3, 'energy': 0.4}),
+    (['rock', 'metal', 'alternative'],
+     ['OPM rock', 'Filipino rock', 'Pinoy alternative', 'Pinoy metal'], {'energy': 0.8, 'loudness': -5}),
+]
+DEFAULT_MOOD_PLAN = (['OPM hits', 'Filipino pop', 'Pinoy classics'], {'valence': 0.6, 'energy': 0.6})
+
+OPM_ARTISTS = [
+    'Ben&Ben', 'Moira Dela Torre', 'December Avenue', 'The Juans',
+    'IV of Spades', 'Unique Salonga', 'SB19', 'BINI', 'Parokya ni Edgar',
+    'Rivermaya', 'Eraserheads', 'Bamboo', 'Sponge Cola', 'Silent Sanctuary',
+    'Kamikazee', 'Callalily', 'Moonstar88', 'Itchyworms', 'Orange and Lemons',
+    'Hale', 'Urbandub', 'Typecast', 'Chicosci', 'Sandwich', 'Teeth',
+    'Yeng Constantino', 'Sarah Geronimo', 'Regine Velasquez', 'Gary Valenciano'
+]
+# Artists tried, in order, when a mood search comes up empty
+MOOD_FALLBACK_ARTISTS = OPM_ARTISTS[:5]
+GENERIC_OPM_QUERY = 'OPM Filipino music'
+
+INDIE_SEARCH_TERMS = [
+    '"filipino indie" market:PH',
+    '"pinoy underground" market:PH',
+    '"manila music scene" market:PH',
+    '"quezon city bands" market:PH',
+    '"OPM indie" market:PH',
+    '"pinoy DIY" market:PH',
+    '"filipino alternative" market:PH',
+    '"independent filipino" market:PH'
+]
+
+# Key independent Filipino labels
+INDIE_LABELS = [
+    'O/C Records',
+    'PolyEast Records',
+    'Music Colony Records',
+    'Downtown Q',
+    'LIAB Studios',
+    'Tarsier Records',
+    'Offshore Music',
+    'Careless Music Manila'
+]
+
+# Regional music scenes and venues
+REGIONAL_TERMS = [
+    '"route 196" manila',  # Famous indie venue
+    '"mows bar" quezon city',
+    '"saguijo" makati',
+    '"b-side" the collective',
+    '"cebu music scene"',
+    '"davao indie"',
+    '"baguio musicians"',
+    '"iloilo bands"',
+    '"bacolod music"'
+]
+
+# Popularity ceilings for the discovery strategies
+INDIE_MAX_POPULARITY = 30
+EMERGING_MAX_POPULARITY = 25
+REGIONAL_MAX_POPULARITY = 35
+
+# Strategies tried after the station's own mood, for variety
+VARIETY_MOODS = ["masayang pop song", "romantic ballad", "energetic rock", "chill acoustic", "dance party song"]
+GENRE_QUERIES = ["OPM rock", "Filipino pop", "Pinoy alternative"]
+
+
+def mood_search_plan(mood_description):
+    """OPM search terms and recommendation targets for a mood description"""
+    mood_lower = mood_description.lower()
+    for keywords, terms, features in MOOD_SEARCH_PLANS:
+        if any(word in mood_lower for word in keywords):
+            return terms, features
+    return DEFAULT_MOOD_PLAN
+
+
+def emerging_search_terms():
+    """Recent-release searches, anchored on the current year"""
+    current_year = datetime.now().year
+    last_year = current_year - 1
+    return [
+        f'"OPM" year:{current_year} market:PH',
+        f'"filipino music" year:{current_year} market:PH',
+        f'"pinoy artist" year:{last_year}-{current_year} market:PH',
+        f'genre:"philippines-opm" year:{last_year}-{current_year}'
+    ]
+
+
+def newest_lowest_popularity(tracks, limit=10):
+    """De-duplicated tracks, newest release first and least popular first within a date"""
+    unique_tracks = list({track['id']: track for track in tracks}.values())
+    return sorted(unique_tracks, key=lambda x: (x['album']['release_date'], x['popularity']), reverse=True)[:limit]
+
+
+class CandidatePool:
+    """Shared track candidates, one de-duplicated bucket per mood/artist/label/genre, reused across stations"""
+
+    def __init__(self, ttl=1800):
+        self.ttl = ttl   # how long harvested results stay eligible (seconds)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def add(self, bucket, tracks, source=""):
+        """Harvest every track from a search result page into a bucket"""
+        now = time.time()
+        with self._lock:
+            entries = self._buckets.setdefault(bucket, {})
+            for track in tracks:
+                if not track or not track.get('id') or track['id'] in entries:
+                    continue
+                entries[track['id']] = {
+                    'track': track,
+                    'source': source,
+                    'popularity': track.get('popularity', 0),
+                    'added_at': now,
+                    'expires_at': now + self.ttl,
+                }
+
+    def draw(self, bucket, exclude_ids=None, key=None):
+        """Take one unexpired track out of a bucket, or None if the bucket needs a new search"""
+        now = time.time()
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            if not entries:
+                return None
+
+            # Drop expired candidates so stale results trigger a fresh search
+            for track_id in [tid for tid, entry in entries.items() if entry['expires_at'] <= now]:
+                del entries[track_id]
+
+            candidates = [entry for tid, entry in entries.items() if not exclude_ids or tid not in exclude_ids]
+            if not candidates:
+                return None
+
+            entry = min(candidates, key=key) if key else random.choice(candidates)
+            del entries[entry['track']['id']]
+            return entry['track']
+
+
+def lowest_popularity(entry):
+    return entry['popularity']
+
+
+# --- Async strategies on AsyncSpotify ------------------------------------------
+# Spotify errors end a strategy quietly, like the sync ones; StationError (signed out) propagates.
+
+async def search_page(spotify, query, limit):
+    try:
+        return await spotify.search_tracks(query, limit=limit)
+    except (httpx.HTTPError, KeyError, ValueError):
+        return []
+
+
+async def harvest(spotify, pool, bucket, query, limit, exclude_ids=None, source=None, key=None):
+    """Search once, pool the page and draw a track from the bucket"""
+    tracks = await search_page(spotify, query, limit)
+    if not tracks:
+        return None
+    pool.add(bucket, tracks, source=source or query)
+    return pool.draw(bucket, exclude_ids, key=key)
+
+
+async def asearch_by_mood(spotify, pool, mood_description, exclude_ids=None):
+    """Mood bucket, then recommendations and mood searches; artist and generic results stay in their own buckets"""
+    terms, features = mood_search_plan(mood_description)
+    bucket = f"mood:{terms[0]}"
+    track = pool.draw(bucket, exclude_ids)
+    if track:
+        return track
+
+    try:
+        recommendations = await spotify.recommendations(['philippines-opm'], limit=20, **features)
+        pool.add(bucket, recommendations, source='recommendations')
+        track = pool.draw(bucket, exclude_ids)
+        if track:
+            return track
+    except (httpx.HTTPError, KeyError, ValueError):
+        pass
+
+    for term in terms:
+        track = await harvest(spotify, pool, bucket, term, 50, exclude_ids)
+        if track:
+            return track
+
+    for artist in MOOD_FALLBACK_ARTISTS:
+        artist_bucket = f"artist:{artist}"
+        track = pool.draw(artist_bucket, exclude_ids) or await harvest(
+            spotify, pool, artist_bucket, f'artist:{artist}', 20, exclude_ids)
+        if track:
+            return track
+
+    generic_bucket = f"genre:{GENERIC_OPM_QUERY}"
+    return pool.draw(generic_bucket, exclude_ids) or await harvest(
+        spotify, pool, generic_bucket, GENERIC_OPM_QUERY, 20, exclude_ids)
+
+
+async def asearch_by_random_opm_artist(spotify, pool, exclude_ids=None):
+    # Pick the artist first so every call can land on a different artist, then reuse its bucket
+    artist = random.choice(OPM_ARTISTS)
+    bucket = f"artist:{artist}"
+    return pool.draw(bucket, exclude_ids) or await harvest(
+        spotify, pool, bucket, f'artist:"{artist}"', 20, exclude_ids, source=f'artist:{artist}')
+
+
+async def asearch_opm_by_genre(spotify, pool, genre_query, exclude_ids=None):
+    bucket = f"genre:{genre_query}"
+    return pool.draw(bucket, exclude_ids) or await harvest(spotify, pool, bucket, genre_query, 50, exclude_ids)
+
+
+async def adiscover_indie_opm_artists(spotify, pool, exclude_ids=None):
+    """Low-popularity tracks from all indie searches, run concurrently"""
+    track = pool.draw("indie", exclude_ids)
+    if track:
+        return track
+    pages = await asyncio.gather(*(search_page(spotify, term, 50) for term in INDIE_SEARCH_TERMS))
+    pool.add("indie", [track for page in pages for track in page if track['popularity'] < INDIE_MAX_POPULARITY],
+             source='indie search')
+    return pool.draw("indie", exclude_ids)
+
+
+async def adiscover_emerging_opm_artists(spotify, pool, exclude_ids=None):
+    """Newest, least popular recent releases"""
+    track = pool.draw("emerging", exclude_ids)
+    if track:
+        return track
+    pages = await asyncio.gather(*(search_page(spotify, term, 50) for term in emerging_search_terms()))
+    emerging = [track for page in pages for track in page if track['popularity'] < EMERGING_MAX_POPULARITY]
+    pool.add("emerging", newest_lowest_popularity(emerging), source='emerging search')
+    return pool.draw("emerging", exclude_ids)
+
+
+async def asearch_by_independent_labels(spotify, pool, exclude_ids=None):
+    # Visit labels in random order so stations don't all drain the same label's bucket
+    for label in random.sample(INDIE_LABELS, len(INDIE_LABELS)):
+        bucket = f"label:{label}"
+        track = pool.draw(bucket, exclude_ids, key=lowest_popularity)
+        if track:
+            return track
+        tracks = await search_page(spotify, f'label:"{label}" market:PH', 20)
+        if not tracks:
+            # Try alternative search if label search doesn't work
+            tracks = await search_page(spotify, f'"{label}" filipino music', 20)
+        if tracks:
+            pool.add(bucket, tracks, source=label)
+            track = pool.draw(bucket, exclude_ids, key=lowest_popularity)
+            if track:
+                return track
+    return None
+
+
+async def asearch_regional_opm_scenes(spotify, pool, exclude_ids=None):
+    track = pool.draw("regional", exclude_ids)
+    if track:
+        return track
+    for term in REGIONAL_TERMS:
+        tracks = await search_page(spotify, f'{term} filipino', 30)
+        regional = [track for track in tracks if track['popularity'] < REGIONAL_MAX_POPULARITY]
+        if regional:
+            pool.add("regional", regional, source=term)
+            return pool.draw("regional", exclude_ids)
+    return None
+
+
+async def aselect_opm_tracks(spotify, pool, mood_description, count=5):
+    """Diverse OPM tracks for a station, trying the same strategies in the same order as the sync app.
+
+    Strategies run concurrently in batches just big enough to fill the remaining
+    slots; a duplicate drawn from overlapping buckets is dropped and the next batch fills in.
+    """
+    tracks = []
+    track_ids_seen = set()
+    strategies = [
+        lambda: asearch_by_mood(spotify, pool, mood_description, track_ids_seen),
+        lambda: asearch_by_random_opm_artist(spotify, pool, track_ids_seen),
+        lambda: adiscover_indie_opm_artists(spotify, pool, track_ids_seen),
+        lambda: adiscover_emerging_opm_artists(spotify, pool, track_ids_seen),
+        lambda: asearch_by_independent_labels(spotify, pool, track_ids_seen),
+        lambda: asearch_regional_opm_scenes(spotify, pool, track_ids_seen),
+    ]
+    strategies += [lambda mood=mood: asearch_by_mood(spotify, pool, mood, track_ids_seen) for mood in VARIETY_MOODS]
+    strategies += [lambda genre=genre: asearch_opm_by_genre(spotify, pool, genre, track_ids_seen) for genre in GENRE_QUERIES]
+
+    while strategies and len(tracks) < count:
+        batch, strategies = strategies[:count - len(tracks)], strategies[count - len(tracks):]
+        for track in await asyncio.gather(*(strategy() for strategy in batch)):
+            if track and track['id'] not in track_ids_seen and len(tracks) < count:
+                tracks.append(track)
+                track_ids_seen.add(track['id'])
+    return tracks